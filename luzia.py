@@ -20,11 +20,12 @@ from openai import OpenAI
 from colorama import init, Fore, Back, Style
 
 from tools import ToolManager
+from tools.tool_manager import OPENAI_MAX_RETRIES
 from tools.memory_manager import MemoryManager, select_memory_system
 from update_manager import apply_conversation_updates
 
 # Get function schemas in Responses API format for this application
-FUNCTION_SCHEMAS_RESPONSES = ToolManager().get_function_schemas("responses")
+FUNCTION_SCHEMAS_RESPONSES = ToolManager.get_function_schemas("responses")
 
 # Initialize colorama for cross-platform colored output
 init(autoreset=True)
@@ -43,13 +44,14 @@ class Luzia:
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        self.client = OpenAI(api_key=api_key)
+        # The tool manager shares this client, so it carries the tools' retry budget too
+        self.client = OpenAI(api_key=api_key, max_retries=OPENAI_MAX_RETRIES)
         
         # Initialize memory manager
         self.memory = MemoryManager(memory_system)
         
         # Initialize tool manager for other functions (math, media)
-        self.tool_manager = ToolManager()
+        self.tool_manager = ToolManager(client=self.client)
         
         # Conversation history (fresh each session)
         self.conversation_history: List[Dict[str, Any]] = []
@@ -377,12 +379,10 @@ Timestamp: {json.dumps(messages, indent=2, ensure_ascii=False)}
                                 if self.show_trace:
                                     print(f"{Fore.YELLOW}🖼️  Auto-analyzing recommended media files...{Style.RESET_ALL}")
                                 
-                                # Call analyze_media_file for each recommended file
-                                for media_file in media_files:
+                                # Analyze all recommended files concurrently; results come back in order
+                                media_results = self.tool_manager.media_tools.analyze_media_files(media_files)
+                                for media_file, media_result in zip(media_files, media_results):
                                     if media_file:  # Skip empty strings
-                                        # Create a mock tool call for media analysis
-                                        media_result = self.tool_manager.execute_function("analyze_media_file", file_path=media_file)
-                                        
                                         if self.show_trace:
                                             if media_result.get("status") == "success":
                                                 analysis_text = media_result.get("analysis", "")
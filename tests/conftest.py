@@ -6,11 +6,23 @@ Pytest fixtures and configuration for Luzia tests.
 import pytest
 import tempfile
 import os
-from unittest.mock import patch, MagicMock
+import json
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch, Mock, MagicMock
+from types import SimpleNamespace
 from typing import Dict, Any
+from .math_cases import SAMPLE_TEST_CASES
 
+try:
+    import sympy
+except ImportError:
+    # SymPy is only needed for the math test oracles
+    sympy = None
 
-@pytest.fixture
+
+@pytest.fixture(scope="module")
 def temp_scratchpad_file():
     """Create a temporary scratchpad file for testing."""
     with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
@@ -26,7 +38,7 @@ def temp_scratchpad_file():
         pass
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def temp_system_prompt_file():
     """Create a temporary system prompt file for testing."""
     with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
@@ -64,6 +76,14 @@ A. USER FACTS → B. MEDIA-DOCUMENT SUMMARIES → C. MEDIA FILES""")
         pass
 
 
+@pytest.fixture(scope="session")
+def scratch_pad_tools_class():
+    """Import the backward-compatible ScratchPadTools class once per session."""
+    # Importing tools pulls in openai and SymPy, so only pay for it when a test needs it
+    tools_package = pytest.importorskip("tools")
+    return tools_package.ScratchPadTools
+
+
 @pytest.fixture
 def scratch_pad_tools(temp_scratchpad_file, temp_system_prompt_file):
     """Create ScratchPadTools instance with temporary files."""
@@ -74,6 +94,64 @@ def scratch_pad_tools(temp_scratchpad_file, temp_system_prompt_file):
     )
 
 
+@pytest.fixture(scope="session")
+def png_sample_bytes():
+    """Raw bytes of a valid 1x1 PNG image."""
+    return b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+
+
+@pytest.fixture(scope="session")
+def png_sample_b64(png_sample_bytes):
+    """Expected base64 encoding of png_sample_bytes."""
+    return base64.b64encode(png_sample_bytes).decode('utf-8')
+
+
+@pytest.fixture(scope="module")
+def temp_image_file(tmp_path_factory, png_sample_bytes):
+    """Create a PNG image file once per test module."""
+    image_file = tmp_path_factory.mktemp("image") / "test.png"
+    image_file.write_bytes(png_sample_bytes)
+    return str(image_file)
+
+
+@pytest.fixture(scope="module")
+def png_files_by_ext(tmp_path_factory, png_sample_bytes):
+    """Create the PNG sample under every supported image extension, keyed by extension."""
+    media_dir = tmp_path_factory.mktemp("media")
+    files = {}
+    for ext in ['.jpg', '.jpeg', '.gif', '.webp', '.PNG', '.Jpg', '.JPEG', '.GiF', '.WebP']:
+        image_file = media_dir / f"sample{ext}"
+        image_file.write_bytes(png_sample_bytes)
+        files[ext] = str(image_file)
+    return files
+
+
+@pytest.fixture(scope="module")
+def unicode_png_path(tmp_path_factory, png_sample_bytes):
+    """Create a PNG image whose filename contains Unicode characters."""
+    image_file = tmp_path_factory.mktemp("unicode") / "测试图片_émoji🖼️.png"
+    image_file.write_bytes(png_sample_bytes)
+    return str(image_file)
+
+
+@pytest.fixture(scope="module")
+def long_png_path(tmp_path_factory, png_sample_bytes):
+    """Create a PNG image nested 40 directories deep."""
+    deep_dir = tmp_path_factory.mktemp("deep").joinpath(*(["very", "long", "path", "structure"] * 10))
+    deep_dir.mkdir(parents=True, exist_ok=True)
+    image_file = deep_dir / "test.png"
+    image_file.write_bytes(png_sample_bytes)
+    return str(image_file)
+
+
+@pytest.fixture(scope="module")
+def temp_pdf_file(tmp_path_factory):
+    """Create a minimal PDF file once per test module."""
+    pdf_file = tmp_path_factory.mktemp("pdf") / "test.pdf"
+    pdf_file.write_bytes(b'%PDF-1.4\ntest pdf content')
+    return str(pdf_file)
+
+
 @pytest.fixture
 def math_tools():
     """Create MathTools instance for testing mathematical functions."""
@@ -84,25 +162,176 @@ def math_tools():
 @pytest.fixture
 def mock_openai_client():
     """Mock OpenAI client for all tool modules."""
-    with patch('tools.scratchpad_tools.OpenAI') as mock_scratchpad_openai, \
+    with patch('tools.tool_manager.OpenAI') as mock_manager_openai, \
+         patch('tools.scratchpad_tools.OpenAI') as mock_scratchpad_openai, \
          patch('tools.math_tools.OpenAI') as mock_math_openai, \
          patch('tools.media_tools.OpenAI') as mock_media_openai:
         
         # Create mock instances
         mock_client = MagicMock()
+        mock_manager_openai.return_value = mock_client
         mock_scratchpad_openai.return_value = mock_client
         mock_math_openai.return_value = mock_client
         mock_media_openai.return_value = mock_client
         
         # Mock the responses.create method
-        mock_response = MagicMock()
-        mock_response.output_text = '{"relevant_context": "Test context", "media_files_needed": false, "recommended_media": [], "reasoning": "Test reasoning"}'
-        mock_response.output = []
-        mock_client.responses.create.return_value = mock_response
+        mock_client.responses.create.return_value = SimpleNamespace(
+            output_text='{"relevant_context": "Test context", "media_files_needed": false, "recommended_media": [], "reasoning": "Test reasoning"}',
+            output=[],
+        )
         
         yield mock_client
 
 
+def vision_response(text: str = "") -> SimpleNamespace:
+    """Build a chat completion response carrying the given message text."""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def text_response(text: str = "") -> SimpleNamespace:
+    """Build a Responses API response carrying the given output text."""
+    return SimpleNamespace(output_text=text, output=[])
+
+
+@pytest.fixture(scope="module")
+def mocked_openai():
+    """Mock the client the tool manager builds and hands to the media tools.
+    
+    The mock is built once per module; reset it between tests with reset_mock().
+    """
+    client = Mock()
+    client.chat.completions.create.return_value = vision_response()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr('tools.tool_manager.OpenAI', lambda *args, **kwargs: client)
+        yield client
+
+
+class FakeRoutingClient:
+    """Stand-in for the OpenAI client whose responses.create returns one pre-built response.
+    
+    set_content swaps the reply text in place; setting error makes the call raise.
+    The keyword arguments of every call are kept in requests.
+    """
+    
+    def __init__(self):
+        self.response = SimpleNamespace(output_text="", output=[])
+        self.error = None
+        self.requests = []
+        self.responses = SimpleNamespace(create=self._create)
+    
+    def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        return self.response
+    
+    def set_content(self, content: str) -> None:
+        """Set the text returned by the next responses.create calls."""
+        self.response.output_text = content
+    
+    def reset(self) -> None:
+        """Clear the reply text, any pending error and the recorded requests."""
+        self.error = None
+        self.requests.clear()
+        self.set_content("")
+
+
+@pytest.fixture(scope="session")
+def fake_routing_client():
+    """One FakeRoutingClient shared by the whole session."""
+    return FakeRoutingClient()
+
+
+@pytest.fixture
+def fake_openai_routing(fake_routing_client):
+    """Return the shared fake routing client, reset for this test."""
+    fake_routing_client.reset()
+    return fake_routing_client
+
+
+class OpenAIStubHandler(BaseHTTPRequestHandler):
+    """Answer every POST with the status and JSON body queued on the server."""
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.paths.append(self.path)
+        status, body = self.server.reply
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def responses_api_body(output_text: str) -> Dict[str, Any]:
+    """Build a Responses API JSON body whose output_text is the given text."""
+    return {
+        "id": "resp_test",
+        "object": "response",
+        "created_at": 0,
+        "model": "gpt-4o-mini",
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": "msg_test",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": output_text, "annotations": []}]
+        }],
+        "parallel_tool_calls": False,
+        "tool_choice": "auto",
+        "tools": []
+    }
+
+
+class OpenAIStub:
+    """A real OpenAI client pointed at the local stub server.
+    
+    respond queues a successful reply, fail queues an API error; paths lists the endpoints hit.
+    """
+    
+    def __init__(self, server: HTTPServer):
+        from openai import OpenAI
+        self.server = server
+        self.client = OpenAI(api_key="test-key", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                             max_retries=0)
+        self.respond("")
+        server.paths = []
+    
+    @property
+    def paths(self):
+        return self.server.paths
+    
+    def respond(self, output_text: str) -> None:
+        """Reply to the next requests with a response carrying output_text."""
+        self.server.reply = (200, responses_api_body(output_text))
+    
+    def fail(self, status: int, message: str) -> None:
+        """Reply to the next requests with an API error."""
+        self.server.reply = (status, {"error": {"message": message, "type": "server_error"}})
+
+
+@pytest.fixture(scope="session")
+def openai_stub_server():
+    """Serve canned OpenAI API replies from a local HTTP server for the whole session."""
+    server = HTTPServer(('127.0.0.1', 0), OpenAIStubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def openai_stub(openai_stub_server):
+    """Return an OpenAIStub with an empty reply and no recorded requests."""
+    return OpenAIStub(openai_stub_server)
+
+
 @pytest.fixture  
 def mock_openai_math_routing():
     """Mock OpenAI client specifically for math routing tests."""
@@ -111,51 +340,73 @@ def mock_openai_math_routing():
         mock_openai.return_value = mock_client
         
         # Mock math routing response
-        mock_response = MagicMock()
-        mock_response.output_text = '{"operation": "solve_equation", "needs_context": false, "query": "2x + 3 = 7"}'
-        mock_response.output = []
-        mock_client.responses.create.return_value = mock_response
+        mock_client.responses.create.return_value = SimpleNamespace(
+            output_text='{"operation": "solve_equation", "needs_context": false, "query": "2x + 3 = 7"}',
+            output=[],
+        )
         
         yield mock_client
 
 
-@pytest.fixture
-def sample_test_cases():
-    """Sample test cases for mathematical operations."""
+def _build_oracles():
+    """Build the pre-parsed oracle case lists from the string test cases.
+    
+    The math tests compare against ready-made SymPy objects instead of
+    re-parsing the same strings inside every test body. Known oracles are
+    composed directly from Symbols, bypassing the string parser altogether.
+    """
+    x = sympy.Symbol("x")
+    known = {
+        "5*x": 5*x,
+        "(x + 1)**2": (x + 1)**2,
+        "1": sympy.Integer(1),
+        "2*x": 2*x,
+        "cos(x)": sympy.cos(x),
+        "exp(x)": sympy.exp(x),
+        "x**2 - 1": x**2 - 1,
+        "x**2 + 2*x + 1": x**2 + 2*x + 1,
+        "6*x**2 + 11*x + 3": 6*x**2 + 11*x + 3,
+        "(x - 1)*(x + 1)": (x - 1)*(x + 1),
+        "(2*x + 3)*(3*x + 1)": (2*x + 3)*(3*x + 1),
+    }
+    
+    def oracle(expression):
+        if expression in known:
+            return known[expression]
+        return sympy.sympify(expression, rational=True)
+    
     return {
-        "equations": [
-            ("2*x + 3 = 7", "x", ["2"]),
-            ("x**2 - 4 = 0", "x", ["-2", "2"]),
-            ("x + 1 = 0", "x", ["-1"])
-        ],
-        "expressions": [
-            ("2*x + 3*x", "5*x"),
-            ("x**2 + 2*x + 1", "(x + 1)**2"),
-            ("sin(x)**2 + cos(x)**2", "1")
+        "expressions_parsed": [
+            (expression, expected, oracle(expected))
+            for expression, expected in SAMPLE_TEST_CASES["expressions"]
         ],
-        "derivatives": [
-            ("x**2", "x", 1, "2*x"),
-            ("sin(x)", "x", 1, "cos(x)"),
-            ("exp(x)", "x", 1, "exp(x)")
+        "derivatives_parsed": [
+            (expression, variable, order, expected, oracle(expected))
+            for expression, variable, order, expected in SAMPLE_TEST_CASES["derivatives"]
         ],
-        "integrals": [
-            ("x", "x**2/2"),
-            ("2*x", "x**2"),
-            ("x**2", "x**3/3")
+        "factors_parsed": [
+            (expression, expected, oracle(expression), sympy.expand(oracle(expected)))
+            for expression, expected in SAMPLE_TEST_CASES["factors"]
         ],
-        "factors": [
-            ("x**2 - 1", "(x - 1)*(x + 1)"),
-            ("x**2 + 2*x + 1", "(x + 1)**2"),
-            ("6*x**2 + 11*x + 3", "(2*x + 3)*(3*x + 1)")
-        ],
-        "arithmetic": [
-            ("2 + 3 * 4", 14),
-            ("100 / 4", 25),
-            ("2**3", 8)
-        ]
     }
 
 
+def pytest_configure(config):
+    # Set once per session; tools/__init__.py builds an OpenAI client at import time
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    
+    # Test modules read the oracle lists at collection time, which runs after this hook.
+    # Without SymPy test_math_functions skips itself before it reads them.
+    if sympy is not None:
+        SAMPLE_TEST_CASES.update(_build_oracles())
+
+
+@pytest.fixture
+def sample_test_cases():
+    """Sample test cases for mathematical operations."""
+    return SAMPLE_TEST_CASES
+
+
 @pytest.fixture
 def setup_test_environment(temp_scratchpad_file, temp_system_prompt_file):
     """Set up complete test environment with all necessary files."""
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Math test cases shared by conftest and the math test modules.
+
+Kept out of conftest so that tests import one module instance: pytest loads
+conftest itself, and importing it again from a test module could yield a
+second copy. pytest_configure in conftest adds the pre-parsed "*_parsed"
+oracle lists to SAMPLE_TEST_CASES before the tests are collected.
+"""
+
+
+SAMPLE_TEST_CASES = {
+    "equations": [
+        ("2*x + 3 = 7", "x", ["2"]),
+        ("x**2 - 4 = 0", "x", ["-2", "2"]),
+        ("x + 1 = 0", "x", ["-1"])
+    ],
+    "expressions": [
+        ("2*x + 3*x", "5*x"),
+        ("x**2 + 2*x + 1", "(x + 1)**2"),
+        ("sin(x)**2 + cos(x)**2", "1")
+    ],
+    "derivatives": [
+        ("x**2", "x", 1, "2*x"),
+        ("sin(x)", "x", 1, "cos(x)"),
+        ("exp(x)", "x", 1, "exp(x)")
+    ],
+    "integrals": [
+        ("x", "x**2/2"),
+        ("2*x", "x**2"),
+        ("x**2", "x**3/3")
+    ],
+    "factors": [
+        ("x**2 - 1", "(x - 1)*(x + 1)"),
+        ("x**2 + 2*x + 1", "(x + 1)**2"),
+        ("6*x**2 + 11*x + 3", "(2*x + 3)*(3*x + 1)")
+    ],
+    "arithmetic": [
+        ("2 + 3 * 4", 14),
+        ("100 / 4", 25),
+        ("2**3", 8)
+    ]
+}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Unit tests for image generation and prompt improvement in ImageTools.
+"""
+
+import pytest
+from unittest.mock import Mock, patch
+from tools.image_tools import ImageTools
+from .conftest import vision_response
+
+
+@pytest.fixture
+def image_tools(tmp_path, monkeypatch):
+    """Create ImageTools with a mocked client, keeping its media directory under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    return ImageTools(client=Mock())
+
+
+class TestImprovePrompt:
+    """Test prompt enhancement before image generation."""
+    
+    @pytest.mark.unit
+    def test_improve_prompt_success(self, image_tools):
+        """Test that the improved prompt is stripped and the instructions reach the model."""
+        image_tools.client.chat.completions.create.return_value = vision_response("  A gorilla dunking at sunset  ")
+        
+        result = image_tools.improve_prompt("gorilla dunking", "warm colors")
+        
+        assert result["status"] == "success"
+        assert result["improved_prompt"] == "A gorilla dunking at sunset"
+        assert result["additional_instructions"] == "warm colors"
+        user_message = image_tools.client.chat.completions.create.call_args[1]["messages"][1]["content"]
+        assert user_message == "Original prompt: gorilla dunking\nAdditional instructions: warm colors"
+    
+    @pytest.mark.unit
+    def test_improve_prompt_api_error_keeps_original(self, image_tools):
+        """Test that a failed improvement falls back to the original prompt."""
+        image_tools.client.chat.completions.create.side_effect = Exception("API down")
+        
+        result = image_tools.improve_prompt("gorilla dunking")
+        
+        assert result["status"] == "error"
+        assert result["message"] == "Error improving prompt: API down"
+        assert result["improved_prompt"] == "gorilla dunking"
+
+
+class TestGenerateImage:
+    """Test image generation requests."""
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("improve,improvement,expected_prompt", [
+        (True, vision_response("Improved gorilla"), "Improved gorilla"),
+        (True, Exception("API down"), "gorilla"),
+        (False, None, "gorilla")
+    ])
+    def test_generate_image_prompt_sent(self, image_tools, improve, improvement, expected_prompt):
+        """Test which prompt reaches DALL-E with and without a successful improvement."""
+        if isinstance(improvement, Exception):
+            image_tools.client.chat.completions.create.side_effect = improvement
+        else:
+            image_tools.client.chat.completions.create.return_value = improvement
+        image_tools.client.images.generate.side_effect = Exception("Content policy violation")
+        
+        result = image_tools.generate_image("gorilla", improve_prompt=improve)
+        
+        assert image_tools.client.images.generate.call_args[1]["prompt"] == expected_prompt
+        assert image_tools.client.chat.completions.create.called == improve
+        assert result["status"] == "error"
+        assert result["message"] == "Error generating image: Content policy violation"
+        assert result["file_path"] is None
+    
+    @pytest.mark.unit
+    def test_generate_image_with_context_builds_instructions(self, image_tools):
+        """Test that context entries become prompt improvement instructions."""
+        context = {
+            "previous_prompts": "a gorilla",
+            "edit_request": "add a hat",
+            "style_preferences": "watercolor",
+            "unrelated": "ignored"
+        }
+        with patch.object(image_tools, 'generate_image', return_value={"status": "success"}) as generate:
+            result = image_tools.generate_image_with_context("make it fancier", context)
+        
+        assert result == {"status": "success"}
+        generate.assert_called_once_with(
+            prompt="make it fancier",
+            improve_prompt=True,
+            additional_instructions="Build upon previous image concepts: a gorilla. "
+                                    "Apply these modifications: add a hat. Maintain style: watercolor."
+        )
+    
+    @pytest.mark.unit
+    def test_generate_image_with_context_without_context(self, image_tools):
+        """Test that a request without context is improved with no extra instructions."""
+        with patch.object(image_tools, 'generate_image', return_value={"status": "success"}) as generate:
+            image_tools.generate_image_with_context("a gorilla")
+        
+        assert generate.call_args[1]["additional_instructions"] == ""
@@ -6,15 +6,27 @@ Integration tests for ScratchPadTools - testing component interactions.
 import pytest
 import json
 import os
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch
 from tools import ScratchPadTools, FUNCTION_SCHEMAS
+from tools import math_tools
+from tools.tool_manager import OPENAI_MAX_RETRIES
+from .conftest import text_response, vision_response
+
+
+@pytest.fixture(autouse=True)
+def clear_math_result_caches():
+    """Drop memoized derivatives/integrals/simplifications so results from patched sympy functions don't leak."""
+    yield
+    math_tools._derivative_cached.cache_clear()
+    math_tools._integral_cached.cache_clear()
+    math_tools._simplify_cached.cache_clear()
 
 
 class TestToolIntegration:
     """Test integration between different tool components."""
     
     @pytest.mark.integration
-    def test_full_workflow_with_context_and_math(self, temp_scratchpad_file, temp_system_prompt_file, temp_math_routing_prompt_file):
+    def test_full_workflow_with_context_and_math(self, temp_scratchpad_file, temp_system_prompt_file):
         """Test complete workflow: context extraction -> math routing -> calculation."""
         # Mock responses for each step
         context_response = {
@@ -29,43 +41,40 @@ class TestToolIntegration:
             "needs_context": True
         }
         
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Setup mock responses in sequence
-            mock_responses = [
-                # First call: routing decision
-                Mock(choices=[Mock(message=Mock(content=json.dumps(routing_response)))]),
-                # Second call: context extraction
-                Mock(choices=[Mock(message=Mock(content=json.dumps(context_response)))])
-            ]
-            mock_client.chat.completions.create.side_effect = mock_responses
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            # Mock the final solve_equation call
-            expected_solution = {
-                "status": "success",
-                "equation": "2*x + 3 = 7",
-                "variable": "x",
-                "solutions": ["2"],
-                "solution_type": "symbolic"
-            }
-            
-            with patch.object(tools, 'solve_equation', return_value=expected_solution):
-                result = tools.solve_math("solve this like you did before: 2x + 3 = 7")
-                
-                # Verify the complete workflow
-                assert result["status"] == "success"
-                assert result["routing_decision"]["operation"] == "solve_equation"
-                assert result["routing_decision"]["context_used"] == True
-                assert "step-by-step" in result["routing_decision"]["context_content"]
-                assert result["solutions"] == ["2"]
-                
-                # Verify API calls were made
-                assert mock_client.chat.completions.create.call_count == 2
+        mock_client = Mock()
+        
+        # Setup mock responses in sequence
+        mock_responses = [
+            # First call: routing decision
+            text_response(json.dumps(routing_response)),
+            # Second call: context extraction
+            text_response(json.dumps(context_response))
+        ]
+        mock_client.responses.create.side_effect = mock_responses
+        
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=mock_client)
+        
+        # Mock the final solve_equation call
+        expected_solution = {
+            "status": "success",
+            "equation": "2*x + 3 = 7",
+            "variable": "x",
+            "solutions": ["2"],
+            "solution_type": "symbolic"
+        }
+        
+        with patch.object(tools.math_tools, 'solve_equation', return_value=expected_solution):
+            result = tools.solve_math("solve this like you did before: 2x + 3 = 7")
+            
+            # Verify the complete workflow
+            assert result["status"] == "success"
+            assert result["routing_decision"]["operation"] == "solve_equation"
+            assert result["routing_decision"]["context_used"] == True
+            assert "step-by-step" in result["routing_decision"]["context_content"]
+            assert result["solutions"] == ["2"]
+            
+            # Verify API calls were made
+            assert mock_client.responses.create.call_count == 2
     
     @pytest.mark.integration
     def test_context_triggers_media_analysis(self, temp_scratchpad_file, temp_system_prompt_file, temp_image_file):
@@ -85,34 +94,23 @@ class TestToolIntegration:
             "mime_type": "image/png"
         }
         
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Mock context response
-            context_mock = Mock()
-            context_mock.choices = [Mock()]
-            context_mock.choices[0].message.content = json.dumps(context_response_with_media)
-            
-            # Mock media analysis response
-            media_mock = Mock()
-            media_mock.choices = [Mock()]
-            media_mock.choices[0].message.content = "This image contains a 1x1 pixel test image"
-            
-            mock_client.chat.completions.create.side_effect = [context_mock, media_mock]
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            # Test context extraction
-            context_result = tools.get_scratch_pad_context("tell me about the gorilla image")
-            assert context_result["media_files_needed"] == True
-            assert temp_image_file in context_result["recommended_media"]
-            
-            # Test subsequent media analysis
-            media_result = tools.analyze_media_file(temp_image_file)
-            assert media_result["status"] == "success"
-            assert media_result["file_type"] == "image"
+        mock_client = Mock()
+        
+        # Context extraction goes through the Responses API, image analysis through chat completions
+        mock_client.responses.create.return_value = text_response(json.dumps(context_response_with_media))
+        mock_client.chat.completions.create.return_value = vision_response("This image contains a 1x1 pixel test image")
+        
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=mock_client)
+        
+        # Test context extraction
+        context_result = tools.get_scratch_pad_context("tell me about the gorilla image")
+        assert context_result["media_files_needed"] == True
+        assert temp_image_file in context_result["recommended_media"]
+        
+        # Test subsequent media analysis
+        media_result = tools.analyze_media_file(temp_image_file)
+        assert media_result["status"] == "success"
+        assert media_result["file_type"] == "image"
     
     @pytest.mark.integration
     def test_function_schemas_completeness(self):
@@ -125,7 +123,8 @@ class TestToolIntegration:
         expected_schema_methods = [
             'get_scratch_pad_context',
             'analyze_media_file', 
-            'solve_math'
+            'solve_math',
+            'generate_image'
         ]
         
         # Get function names from schemas
@@ -173,24 +172,21 @@ class TestToolIntegration:
                 assert "description" in prop
     
     @pytest.mark.integration 
-    def test_error_propagation_through_components(self, temp_scratchpad_file, temp_system_prompt_file, temp_math_routing_prompt_file):
+    def test_error_propagation_through_components(self, temp_scratchpad_file, temp_system_prompt_file):
         """Test that errors propagate correctly through the system."""
         # Test math routing error propagation
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Mock API error in routing
-            mock_client.chat.completions.create.side_effect = Exception("Routing API failed")
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            result = tools.solve_math("solve equation")
-            
-            assert result["status"] == "error"
-            assert "Error in math routing" in result["message"]
-            assert "Routing API failed" in result["message"]
+        mock_client = Mock()
+        
+        # Mock API error in routing
+        mock_client.responses.create.side_effect = Exception("Routing API failed")
+        
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=mock_client)
+        
+        result = tools.solve_math("solve equation")
+        
+        assert result["status"] == "error"
+        assert "Error in math routing" in result["message"]
+        assert "Routing API failed" in result["message"]
     
     @pytest.mark.integration
     def test_environment_configuration_integration(self):
@@ -200,6 +196,48 @@ class TestToolIntegration:
             with pytest.raises(ValueError, match="OPENAI_API_KEY not found"):
                 ScratchPadTools()
     
+    @pytest.mark.integration
+    def test_injected_clients_skip_api_key_check(self, temp_scratchpad_file, temp_system_prompt_file):
+        """Test that injected OpenAI clients are shared by every tool and need no API key."""
+        mock_client = Mock()
+        mock_aclient = Mock()
+        with patch.dict(os.environ, {}, clear=True):
+            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file,
+                                    client=mock_client, aclient=mock_aclient)
+        
+        assert tools.client is mock_client
+        assert tools.math_tools.client is mock_client
+        assert tools.media_tools.client is mock_client
+        assert tools.manager.image_tools.client is mock_client
+        assert tools.scratchpad_tools.client is mock_client
+        assert tools.scratchpad_tools.aclient is mock_aclient
+        assert tools.media_tools.aclient is mock_aclient
+    
+    @pytest.mark.integration
+    def test_tools_share_one_built_client(self, temp_scratchpad_file, temp_system_prompt_file):
+        """Test that without injected clients the manager builds one retrying client pair for every tool."""
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
+            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
+        
+        client = tools.math_tools.client
+        assert tools.media_tools.client is client
+        assert tools.manager.image_tools.client is client
+        assert tools.scratchpad_tools.client is client
+        assert tools.media_tools.aclient is tools.scratchpad_tools.aclient
+        assert client.max_retries == tools.media_tools.aclient.max_retries == OPENAI_MAX_RETRIES
+    
+    @pytest.mark.integration
+    def test_luzia_client_uses_tool_retry_budget(self):
+        """Test that the client Luzia builds and hands to its tools retries like the tools' own clients."""
+        import luzia
+        
+        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}), \
+             patch.object(luzia, 'MemoryManager'):
+            assistant = luzia.Luzia(show_trace=False)
+        
+        assert assistant.client.max_retries == OPENAI_MAX_RETRIES
+        assert assistant.tool_manager.math_tools.client is assistant.client
+    
     @pytest.mark.integration
     def test_file_path_resolution_integration(self, temp_scratchpad_file, temp_system_prompt_file):
         """Test that file path resolution works across components."""
@@ -226,7 +264,7 @@ class TestMathFunctionIntegration:
     """Test integration between mathematical functions and expression parsing."""
     
     @pytest.mark.integration
-    def test_expression_parsing_across_math_functions(self, scratch_pad_tools):
+    def test_expression_parsing_across_math_functions(self, math_tools):
         """Test that expression parsing works consistently across all math functions."""
         test_expression = "3x^2 + 2x + 1"  # Natural notation
         expected_parsed = "3*x**2 + 2*x + 1"  # SymPy notation
@@ -246,12 +284,12 @@ class TestMathFunctionIntegration:
                  patch('sympy.integrate'):
                 
                 # The parsing happens in _parse_expression_safely
-                parsed = scratch_pad_tools._parse_expression_safely(test_expression)
+                parsed = math_tools._parse_expression_safely(test_expression)
                 assert "3*x**2" in str(parsed)
                 assert "2*x" in str(parsed)
     
     @pytest.mark.integration
-    def test_math_function_error_consistency(self, scratch_pad_tools):
+    def test_math_function_error_consistency(self, math_tools):
         """Test that all math functions handle errors consistently."""
         invalid_expression = "invalid$%expression"
         
@@ -265,7 +303,7 @@ class TestMathFunctionIntegration:
         ]
         
         for func_name, args in math_functions:
-            func = getattr(scratch_pad_tools, func_name)
+            func = getattr(math_tools, func_name)
             result = func(*args)
             
             # All should return consistent error structure
@@ -275,7 +313,39 @@ class TestMathFunctionIntegration:
                    "Error calculating" in result["message"]
     
     @pytest.mark.integration
-    def test_solve_math_routing_to_actual_functions(self, temp_scratchpad_file, temp_system_prompt_file, temp_math_routing_prompt_file):
+    @pytest.mark.parametrize("func_name,args,key,expected", [
+        ("solve_equation", ["2*x + 3 = 7"], "solutions", ["2"]),
+        ("simplify_expression", ["x**2 + 2*x + 1 - (x + 1)**2"], "simplified_expression", "0"),
+        ("calculate_derivative", ["x**3"], "derivative", "3*x**2"),
+        ("calculate_integral", ["x**2", "x", [0, 3]], "integral", "9"),
+        ("factor_expression", ["x**2 - 1"], "factored_expression", "(x - 1)*(x + 1)"),
+        ("calculate_complex_arithmetic", ["12345*67890"], "result", 838102050)
+    ])
+    def test_direct_math_functions_through_manager(self, temp_scratchpad_file, temp_system_prompt_file,
+                                                   func_name, args, key, expected):
+        """Test that the wrapper's direct math methods are dispatched to MathTools by the manager."""
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=Mock())
+        
+        result = getattr(tools, func_name)(*args)
+        
+        assert result["status"] == "success"
+        assert result[key] == expected
+    
+    @pytest.mark.integration
+    def test_unknown_function_through_manager(self, temp_scratchpad_file, temp_system_prompt_file):
+        """Test that the manager reports functions it does not know instead of raising."""
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=Mock())
+        
+        result = tools.manager.execute_function("missing_function", query="anything")
+        
+        assert result == {
+            "status": "error",
+            "message": "Unknown function: missing_function",
+            "function_name": "missing_function"
+        }
+    
+    @pytest.mark.integration
+    def test_solve_math_routing_to_actual_functions(self, temp_scratchpad_file, temp_system_prompt_file, fake_openai_routing):
         """Test that solve_math correctly routes to and calls actual math functions."""
         operations_and_queries = [
             ("solve_equation", "solve 2x + 3 = 7", "solutions"),
@@ -286,38 +356,29 @@ class TestMathFunctionIntegration:
             ("calculate_complex_arithmetic", "calculate 12345*67890", "result")
         ]
         
-        for operation, query, expected_key in operations_and_queries:
-            routing_response = {
-                "operation": operation,
-                "needs_context": False
-            }
-            
-            with patch('tools.OpenAI') as mock_openai:
-                mock_client = Mock()
-                mock_openai.return_value = mock_client
-                
-                routing_mock = Mock()
-                routing_mock.choices = [Mock()]
-                routing_mock.choices[0].message.content = json.dumps(routing_response)
-                mock_client.chat.completions.create.return_value = routing_mock
+        # One tools instance and fake client serve every operation; only the routing reply changes
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=fake_openai_routing)
+        
+        # Don't mock the actual math function - let it run
+        with patch('sympy.solve', return_value=[2]), \
+             patch('sympy.simplify', return_value="simplified"), \
+             patch('sympy.diff', return_value="derivative"), \
+             patch('sympy.integrate', return_value="integral"), \
+             patch('sympy.factor', return_value="factored"), \
+             patch('sympy.sympify', return_value=123456):
+            
+            for operation, query, expected_key in operations_and_queries:
+                fake_openai_routing.set_content(json.dumps({
+                    "operation": operation,
+                    "needs_context": False
+                }))
                 
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                tools.client = mock_client
+                result = tools.solve_math(query)
                 
-                # Don't mock the actual math function - let it run
-                with patch('sympy.solve', return_value=[2]), \
-                     patch('sympy.simplify', return_value="simplified"), \
-                     patch('sympy.diff', return_value="derivative"), \
-                     patch('sympy.integrate', return_value="integral"), \
-                     patch('sympy.factor', return_value="factored"), \
-                     patch('sympy.sympify', return_value=123456):
-                    
-                    result = tools.solve_math(query)
-                    
-                    # Should succeed and contain the expected result key
-                    assert result["status"] == "success"
-                    assert result["routing_decision"]["operation"] == operation
-                    assert expected_key in result
+                # Should succeed and contain the expected result key
+                assert result["status"] == "success"
+                assert result["routing_decision"]["operation"] == operation
+                assert expected_key in result
 
 
 class TestSystemIntegration:
@@ -372,28 +433,23 @@ class TestSystemIntegration:
             large_scratchpad = f.name
         
         try:
-            with patch('tools.OpenAI') as mock_openai:
-                mock_client = Mock()
-                mock_openai.return_value = mock_client
-                
-                # Mock response
-                mock_response = Mock()
-                mock_response.choices = [Mock()]
-                mock_response.choices[0].message.content = json.dumps({
-                    "relevant_context": "Large context processed",
-                    "media_files_needed": False,
-                    "recommended_media": [],
-                    "reasoning": "Successfully processed large content"
-                })
-                mock_client.chat.completions.create.return_value = mock_response
-                
-                tools = ScratchPadTools(large_scratchpad, temp_system_prompt_file)
-                tools.client = mock_client
-                
-                result = tools.get_scratch_pad_context("analyze all items")
-                
-                assert result["status"] == "success"
-                assert "Large context processed" in result["relevant_context"]
+            mock_client = Mock()
+            
+            # Mock response
+            mock_response = text_response(json.dumps({
+                "relevant_context": "Large context processed",
+                "media_files_needed": False,
+                "recommended_media": [],
+                "reasoning": "Successfully processed large content"
+            }))
+            mock_client.responses.create.return_value = mock_response
+            
+            tools = ScratchPadTools(large_scratchpad, temp_system_prompt_file, client=mock_client)
+            
+            result = tools.get_scratch_pad_context("analyze all items")
+            
+            assert result["status"] == "success"
+            assert "Large context processed" in result["relevant_context"]
         finally:
             os.unlink(large_scratchpad)
     
@@ -427,43 +483,38 @@ class TestErrorRecoveryIntegration:
     @pytest.mark.integration
     def test_graceful_degradation_with_api_failures(self, temp_scratchpad_file, temp_system_prompt_file):
         """Test that system degrades gracefully when APIs fail."""
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Simulate intermittent API failures
-            failures = [True, False, True, False]  # Fail, succeed, fail, succeed
-            
-            def side_effect(*args, **kwargs):
-                if failures.pop(0):
-                    raise Exception("API temporarily unavailable")
-                else:
-                    mock_response = Mock()
-                    mock_response.choices = [Mock()]
-                    mock_response.choices[0].message.content = json.dumps({
-                        "relevant_context": "Successfully recovered",
-                        "media_files_needed": False,
-                        "recommended_media": [],
-                        "reasoning": "API call succeeded"
-                    })
-                    return mock_response
-            
-            mock_client.chat.completions.create.side_effect = side_effect
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            # First call should fail
-            result1 = tools.get_scratch_pad_context("test query 1")
-            assert result1["status"] == "error"
-            
-            # Second call should succeed
-            result2 = tools.get_scratch_pad_context("test query 2") 
-            assert result2["status"] == "success"
-            assert "Successfully recovered" in result2["relevant_context"]
+        mock_client = Mock()
+        
+        # Simulate intermittent API failures
+        failures = [True, False, True, False]  # Fail, succeed, fail, succeed
+        
+        def side_effect(*args, **kwargs):
+            if failures.pop(0):
+                raise Exception("API temporarily unavailable")
+            else:
+                mock_response = text_response(json.dumps({
+                    "relevant_context": "Successfully recovered",
+                    "media_files_needed": False,
+                    "recommended_media": [],
+                    "reasoning": "API call succeeded"
+                }))
+                return mock_response
+        
+        mock_client.responses.create.side_effect = side_effect
+        
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=mock_client)
+        
+        # First call should fail
+        result1 = tools.get_scratch_pad_context("test query 1")
+        assert result1["status"] == "error"
+        
+        # Second call should succeed
+        result2 = tools.get_scratch_pad_context("test query 2") 
+        assert result2["status"] == "success"
+        assert "Successfully recovered" in result2["relevant_context"]
     
     @pytest.mark.integration
-    def test_partial_failure_handling(self, temp_scratchpad_file, temp_system_prompt_file, temp_math_routing_prompt_file):
+    def test_partial_failure_handling(self, temp_scratchpad_file, temp_system_prompt_file):
         """Test handling of partial failures in complex operations."""
         # Test solve_math with context fetch failure but successful math operation
         routing_response = {
@@ -471,25 +522,19 @@ class TestErrorRecoveryIntegration:
             "needs_context": True
         }
         
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            routing_mock = Mock()
-            routing_mock.choices = [Mock()]
-            routing_mock.choices[0].message.content = json.dumps(routing_response)
-            mock_client.chat.completions.create.return_value = routing_mock
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            # Mock context failure but math success
-            with patch.object(tools, 'get_scratch_pad_context', return_value={"status": "error", "message": "Context failed"}):
-                with patch.object(tools, 'solve_equation', return_value={"status": "success", "solutions": ["2"]}):
-                    result = tools.solve_math("solve 2x + 3 = 7")
-                    
-                    # Should still succeed with partial failure
-                    assert result["status"] == "success"
-                    assert result["routing_decision"]["context_used"] == True
-                    assert result["routing_decision"]["context_content"] == ""  # Empty due to error
-                    assert result["solutions"] == ["2"] 
\ No newline at end of file
+        mock_client = Mock()
+        
+        mock_client.responses.create.return_value = text_response(json.dumps(routing_response))
+        
+        tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file, client=mock_client)
+        
+        # Mock context failure but math success
+        with patch.object(tools.scratchpad_tools, 'get_scratch_pad_context', return_value={"status": "error", "message": "Context failed"}):
+            with patch.object(tools.math_tools, 'solve_equation', return_value={"status": "success", "solutions": ["2"]}):
+                result = tools.solve_math("solve 2x + 3 = 7")
+                
+                # Should still succeed with partial failure
+                assert result["status"] == "success"
+                assert result["routing_decision"]["context_used"] == True
+                assert result["routing_decision"]["context_content"] == ""  # Empty due to error
+                assert result["solutions"] == ["2"] 
\ No newline at end of file
@@ -4,16 +4,47 @@ Unit tests for mathematical functions in MathTools.
 """
 
 import pytest
-import sympy
-import os
+import functools
+from unittest.mock import patch
+
+# tools.math_tools imports SymPy at module load, so a local/lazy import here
+# would not save anything; skip the module cleanly when SymPy is missing instead.
+sympy = pytest.importorskip("sympy")
+
+from tools import math_tools as math_tools_module
 from tools.math_tools import MathTools
+from .math_cases import SAMPLE_TEST_CASES
+
+try:
+    import symengine
+except ImportError:
+    # SymEngine is optional; the oracles fall back to SymPy without it
+    symengine = None
+
+
+def _equiv(a, b):
+    """Check symbolic equivalence structurally after expansion, falling back to equals()."""
+    # == on SymPy objects is a structural comparison with no assumption queries;
+    # equals() is only needed for non-polynomial forms such as trig identities
+    return sympy.expand(a) == sympy.expand(b) or bool(a.equals(b))
+
+
+@functools.lru_cache(maxsize=None)
+def _expanded(expression):
+    """Parse and expand an expression string, once per distinct string."""
+    return sympy.expand(sympy.parse_expr(expression))
+
 
+def _oracle_equal(actual, expected, expected_obj):
+    """Compare a result string to an oracle, trying SymEngine before SymPy."""
+    if symengine is not None and symengine.expand(symengine.sympify(actual) - symengine.sympify(expected)) == 0:
+        return True
+    return _equiv(_expanded(actual), expected_obj)
 
-@pytest.fixture
+
+@pytest.fixture(scope="module")
 def math_tools():
     """Create MathTools instance for testing."""
-    # Set a test API key
-    os.environ['OPENAI_API_KEY'] = 'test-key'
     return MathTools()
 
 
@@ -68,6 +99,20 @@ class TestMathFunctions:
         result = math_tools._parse_expression_safely("log(x) + exp(x)")
         assert str(result) == "exp(x) + log(x)"
     
+    @pytest.mark.unit
+    def test_parse_expression_safely_cached(self, math_tools):
+        """Test that repeated parses of the same string reuse the cached expression."""
+        first = math_tools._parse_expression_safely("x**2 + 3*x")
+        second = math_tools._parse_expression_safely("x**2 + 3*x")
+        assert first is second
+    
+    @pytest.mark.unit
+    def test_parse_expression_safely_invalid_cached(self, math_tools):
+        """Test that cached parse failures still raise on every call."""
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Invalid mathematical expression"):
+                math_tools._parse_expression_safely("invalid$expression")
+    
     @pytest.mark.unit
     def test_parse_expression_safely_invalid_expression(self, math_tools):
         """Test handling of invalid expressions."""
@@ -75,16 +120,24 @@ class TestMathFunctions:
             math_tools._parse_expression_safely("invalid_expression_with_$%@")
     
     @pytest.mark.unit
-    def test_solve_equation_basic(self, math_tools, sample_test_cases):
+    @pytest.mark.parametrize("equation,variable,expected_solutions", SAMPLE_TEST_CASES["equations"])
+    def test_solve_equation_basic(self, math_tools, equation, variable, expected_solutions):
         """Test basic equation solving."""
-        for equation, variable, expected_solutions in sample_test_cases["equations"]:
-            result = math_tools.solve_equation(equation, variable)
-            
-            assert result["status"] == "success"
-            assert result["equation"] == equation
-            assert result["variable"] == variable
-            assert result["solutions"] == expected_solutions
-            assert result["solution_type"] == "symbolic"
+        result = math_tools.solve_equation(equation, variable)
+        
+        assert result["status"] == "success"
+        assert result["equation"] == equation
+        assert result["variable"] == variable
+        assert result["solutions"] == expected_solutions
+        assert result["solution_type"] == "symbolic"
+    
+    @pytest.mark.unit
+    def test_solve_equation_raw_returns_expressions(self, math_tools):
+        """Test that the raw solver returns SymPy objects instead of strings."""
+        solutions = math_tools.solve_equation_raw("x**2 - 4 = 0", "x")
+        
+        assert all(isinstance(sol, sympy.Basic) for sol in solutions)
+        assert set(solutions) == {sympy.Integer(-2), sympy.Integer(2)}
     
     @pytest.mark.unit
     def test_solve_equation_without_equals(self, math_tools):
@@ -100,30 +153,21 @@ class TestMathFunctions:
         result = math_tools.solve_equation("x**2 + 1 = 0", "x")
         
         assert result["status"] == "success"
-        # Complex solutions
         assert len(result["solutions"]) == 2
-        assert "I" in str(result["solutions"])
-    
-    @pytest.mark.unit
-    def test_solve_equation_invalid(self, math_tools):
-        """Test handling of invalid equations."""
-        result = math_tools.solve_equation("invalid$equation", "x")
-        
-        assert result["status"] == "error"
-        assert "Invalid mathematical expression" in result["message"]
+        # Complex solutions, checked on the SymPy objects rather than their strings
+        solutions = math_tools.solve_equation_raw("x**2 + 1 = 0", "x")
+        assert any(sol.has(sympy.I) for sol in solutions)
     
     @pytest.mark.unit
-    def test_simplify_expression_basic(self, math_tools, sample_test_cases):
+    @pytest.mark.parametrize("expression,expected,expected_obj", SAMPLE_TEST_CASES["expressions_parsed"])
+    def test_simplify_expression_basic(self, math_tools, expression, expected, expected_obj):
         """Test basic expression simplification."""
-        for expression, expected in sample_test_cases["expressions"]:
-            result = math_tools.simplify_expression(expression)
-            
-            assert result["status"] == "success"
-            assert result["original_expression"] == expression
-            # Note: SymPy may format results differently, so we check semantic equivalence
-            simplified = sympy.simplify(sympy.parse_expr(result["simplified_expression"]))
-            expected_simplified = sympy.simplify(sympy.parse_expr(expected))
-            assert simplified.equals(expected_simplified) or str(simplified) == expected
+        result = math_tools.simplify_expression(expression)
+        
+        assert result["status"] == "success"
+        assert result["original_expression"] == expression
+        # Note: SymPy may format results differently, so we check semantic equivalence
+        assert _oracle_equal(result["simplified_expression"], expected, expected_obj)
     
     @pytest.mark.unit
     def test_simplify_expression_already_simplified(self, math_tools):
@@ -135,28 +179,42 @@ class TestMathFunctions:
         assert result["is_simplified"] == False  # No change needed
     
     @pytest.mark.unit
-    def test_simplify_expression_invalid(self, math_tools):
-        """Test handling of invalid expressions for simplification."""
-        result = math_tools.simplify_expression("invalid$expression")
+    def test_simplify_expression_linear_skips_simplify(self, math_tools):
+        """Test that linear expressions are returned without running sympy.simplify."""
+        with patch('sympy.simplify') as mock_simplify:
+            result = math_tools.simplify_expression("3*x - 2*y + 5")
         
-        assert result["status"] == "error"
-        assert "Invalid mathematical expression" in result["message"]
+        mock_simplify.assert_not_called()
+        assert result["status"] == "success"
+        assert result["simplified_expression"] == "3*x - 2*y + 5"
+        assert result["is_simplified"] == False
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("expression,expected", [
+        ("x**2 + 2*x + 1 - (x + 1)**2", "0"),
+        ("(x + 1)**2 - x**2", "2*x + 1")
+    ])
+    def test_simplify_expression_nonlinear_form_of_linear_result(self, math_tools, expression, expected):
+        """Test that expressions which only become linear once expanded are still simplified."""
+        result = math_tools.simplify_expression(expression)
+        
+        assert result["status"] == "success"
+        assert result["simplified_expression"] == expected
+        assert result["is_simplified"] == True
     
     @pytest.mark.unit
-    def test_calculate_derivative_basic(self, math_tools, sample_test_cases):
+    @pytest.mark.parametrize("expression,variable,order,expected,expected_obj", SAMPLE_TEST_CASES["derivatives_parsed"])
+    def test_calculate_derivative_basic(self, math_tools, expression, variable, order, expected, expected_obj):
         """Test basic derivative calculations."""
-        for expression, variable, order, expected in sample_test_cases["derivatives"]:
-            result = math_tools.calculate_derivative(expression, variable, order)
-            
-            assert result["status"] == "success"
-            assert result["original_expression"] == expression
-            assert result["variable"] == variable
-            assert result["order"] == order
-            
-            # Check semantic equivalence - use simplify to normalize both expressions
-            calculated = sympy.simplify(sympy.parse_expr(result["derivative"]))
-            expected_expr = sympy.simplify(sympy.parse_expr(expected))
-            assert calculated.equals(expected_expr) or str(calculated) == str(expected_expr) or str(calculated) == expected
+        result = math_tools.calculate_derivative(expression, variable, order)
+        
+        assert result["status"] == "success"
+        assert result["original_expression"] == expression
+        assert result["variable"] == variable
+        assert result["order"] == order
+        
+        # Check semantic equivalence of the calculated and expected expressions
+        assert _oracle_equal(result["derivative"], expected, expected_obj)
     
     @pytest.mark.unit
     def test_calculate_derivative_first_order_default(self, math_tools):
@@ -177,12 +235,36 @@ class TestMathFunctions:
         assert result["derivative"] == "12*x**2"
     
     @pytest.mark.unit
-    def test_calculate_derivative_invalid(self, math_tools):
-        """Test handling of invalid expressions for derivatives."""
-        result = math_tools.calculate_derivative("invalid$expression")
+    def test_calculate_derivative_memoized(self, math_tools):
+        """Test that repeated derivative requests are served from the cache."""
+        math_tools.calculate_derivative("x**5", "x", 3)
+        hits_before = math_tools_module._derivative_cached.cache_info().hits
         
-        assert result["status"] == "error"
-        assert "Invalid mathematical expression" in result["message"]
+        result = math_tools.calculate_derivative("x**5", "x", 3)
+        
+        assert result["derivative"] == "60*x**2"
+        assert math_tools_module._derivative_cached.cache_info().hits == hits_before + 1
+    
+    @pytest.mark.unit
+    def test_simplify_expression_memoized(self, math_tools):
+        """Test that simplifying the same expression twice runs sympy.simplify once."""
+        math_tools_module._simplify_cached.cache_clear()
+        with patch('sympy.simplify', wraps=sympy.simplify) as mock_simplify:
+            first = math_tools.simplify_expression("sin(x)**2 + cos(x)**2")
+            second = math_tools.simplify_expression("sin(x)**2 + cos(x)**2")
+        
+        assert first == second
+        assert first["simplified_expression"] == "1"
+        assert mock_simplify.call_count == 1
+    
+    @pytest.mark.unit
+    def test_calculate_derivative_small_result_skips_simplify(self, math_tools):
+        """Test that short derivatives are reported as-is without running sympy.simplify."""
+        with patch('sympy.simplify') as mock_simplify:
+            result = math_tools.calculate_derivative("x**3 + 2*x", "x")
+        
+        assert result["simplified_derivative"] == result["derivative"] == "3*x**2 + 2"
+        mock_simplify.assert_not_called()
     
     @pytest.mark.unit
     def test_calculate_integral_indefinite(self, math_tools):
@@ -216,31 +298,21 @@ class TestMathFunctions:
         assert "Limits must be a list of exactly 2 values" in result["message"]
     
     @pytest.mark.unit
-    def test_calculate_integral_invalid_expression(self, math_tools):
-        """Test handling of invalid expressions for integration."""
-        result = math_tools.calculate_integral("invalid$expression")
-        
-        assert result["status"] == "error"
-        assert "Invalid mathematical expression" in result["message"]
-    
-    @pytest.mark.unit
-    def test_factor_expression_basic(self, math_tools, sample_test_cases):
+    @pytest.mark.parametrize("expression,expected,original,expected_expanded", SAMPLE_TEST_CASES["factors_parsed"])
+    def test_factor_expression_basic(self, math_tools, expression, expected, original, expected_expanded):
         """Test basic polynomial factoring."""
-        for expression, expected in sample_test_cases["factors"]:
-            result = math_tools.factor_expression(expression)
-            
-            assert result["status"] == "success"
-            assert result["original_expression"] == expression
-            
-            # Check semantic equivalence by expanding both forms
-            factored = sympy.parse_expr(result["factored_expression"])
-            expected_factored = sympy.parse_expr(expected)
-            original = sympy.parse_expr(expression)
-            
-            # Verify factorization is correct by expanding
-            assert sympy.expand(factored).equals(original)
-            # Verify it matches expected format (may have different ordering)
-            assert sympy.expand(factored).equals(sympy.expand(expected_factored))
+        result = math_tools.factor_expression(expression)
+        
+        assert result["status"] == "success"
+        assert result["original_expression"] == expression
+        
+        # Check semantic equivalence by expanding both forms
+        factored = result["factored_expression"]
+        
+        # Verify factorization is correct by expanding
+        assert _oracle_equal(factored, expression, original)
+        # Verify it matches expected format (may have different ordering)
+        assert _oracle_equal(factored, expected, expected_expanded)
     
     @pytest.mark.unit
     def test_factor_expression_already_factored(self, math_tools):
@@ -249,9 +321,7 @@ class TestMathFunctions:
         
         assert result["status"] == "success"
         # Should remain the same or equivalent
-        factored = sympy.parse_expr(result["factored_expression"])
-        original = sympy.parse_expr("(x + 1)*(x + 2)")
-        assert sympy.expand(factored).equals(sympy.expand(original))
+        assert _oracle_equal(result["factored_expression"], "(x + 1)*(x + 2)", _expanded("(x + 1)*(x + 2)"))
     
     @pytest.mark.unit
     def test_factor_expression_irreducible(self, math_tools):
@@ -263,24 +333,16 @@ class TestMathFunctions:
         assert result["factored_expression"] == "x**2 + 1"
     
     @pytest.mark.unit
-    def test_factor_expression_invalid(self, math_tools):
-        """Test handling of invalid expressions for factoring."""
-        result = math_tools.factor_expression("invalid$expression")
-        
-        assert result["status"] == "error"
-        assert "Invalid mathematical expression" in result["message"]
-    
-    @pytest.mark.unit
-    def test_calculate_complex_arithmetic_basic(self, math_tools, sample_test_cases):
+    @pytest.mark.parametrize("expression,expected", SAMPLE_TEST_CASES["arithmetic"])
+    def test_calculate_complex_arithmetic_basic(self, math_tools, expression, expected):
         """Test complex arithmetic calculations."""
-        for expression, expected in sample_test_cases["arithmetic"]:
-            result = math_tools.calculate_complex_arithmetic(expression)
-            
-            assert result["status"] == "success"
-            assert result["original_expression"] == expression
-            assert result["result"] == expected
-            assert result["result_type"] == "arithmetic"
-            assert result["precision"] == "high"
+        result = math_tools.calculate_complex_arithmetic(expression)
+        
+        assert result["status"] == "success"
+        assert result["original_expression"] == expression
+        assert result["result"] == expected
+        assert result["result_type"] == "arithmetic"
+        assert result["precision"] == "high"
     
     @pytest.mark.unit
     def test_calculate_complex_arithmetic_large_numbers(self, math_tools):
@@ -303,38 +365,64 @@ class TestMathFunctions:
         assert abs(result["result"] - expected) < 1e-10
     
     @pytest.mark.unit
-    def test_calculate_complex_arithmetic_invalid_expression(self, math_tools):
-        """Test handling of invalid arithmetic expressions."""
-        result = math_tools.calculate_complex_arithmetic("invalid_expression")
+    @pytest.mark.parametrize("expression,expected", [
+        ("2 ** 10 - 24", 1000),
+        ("-(7 + 3) * 4", -40),
+        ("1 / 3", "1/3"),
+        ("2 ** -2", "1/4"),
+        ("1.5 * 4 - 0.25", 5.75),
+        ("2.5 - 2.5", 0),
+        ("-7 // 2", -4),
+        ("(1/3) // (1/7)", 2),
+    ])
+    def test_calculate_complex_arithmetic_fast_path(self, math_tools, expression, expected):
+        """Test that plain numeric arithmetic is evaluated without calling SymPy."""
+        with patch.object(math_tools_module.sympy, "sympify") as mock_sympify:
+            result = math_tools.calculate_complex_arithmetic(expression)
+
+        mock_sympify.assert_not_called()
+        assert result["status"] == "success"
+        assert result["result"] == expected
+        assert type(result["result"]) is type(expected)
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("method,message", [
+        ("solve_equation", "Invalid mathematical expression"),
+        ("simplify_expression", "Invalid mathematical expression"),
+        ("calculate_derivative", "Invalid mathematical expression"),
+        ("calculate_integral", "Invalid mathematical expression"),
+        ("factor_expression", "Invalid mathematical expression"),
+        ("calculate_complex_arithmetic", "Error calculating arithmetic expression")
+    ])
+    def test_invalid_expression(self, math_tools, method, message):
+        """Test that every math operation reports invalid expressions as errors."""
+        result = getattr(math_tools, method)("invalid$expression")
         
         assert result["status"] == "error"
-        assert "Error calculating arithmetic expression" in result["message"]
+        assert message in result["message"]
 
 
 class TestExpressionParsingSecurity:
     """Test security aspects of expression parsing."""
     
     @pytest.mark.unit
-    def test_dangerous_input_filtered(self, math_tools):
+    @pytest.mark.parametrize("dangerous_input", [
+        "__import__('os').system('rm -rf /')",
+        "eval('malicious_code')",
+        "exec('dangerous_code')"
+    ])
+    def test_dangerous_input_filtered(self, math_tools, dangerous_input):
         """Test that dangerous characters are filtered out."""
-        # These should be cleaned of dangerous characters
-        dangerous_inputs = [
-            "__import__('os').system('rm -rf /')",
-            "eval('malicious_code')",
-            "exec('dangerous_code')"
-        ]
-        
-        for dangerous_input in dangerous_inputs:
-            # Should either raise ValueError or return cleaned result
-            try:
-                result = math_tools._parse_expression_safely(dangerous_input)
-                # If it doesn't raise an error, the result should be cleaned
-                assert "__import__" not in str(result)
-                assert "eval" not in str(result)
-                assert "exec" not in str(result)
-            except ValueError:
-                # This is acceptable - dangerous input rejected
-                pass
+        # Should either raise ValueError or return cleaned result
+        try:
+            result = math_tools._parse_expression_safely(dangerous_input)
+            # If it doesn't raise an error, the result should be cleaned
+            assert "__import__" not in str(result)
+            assert "eval" not in str(result)
+            assert "exec" not in str(result)
+        except ValueError:
+            # This is acceptable - dangerous input rejected
+            pass
     
     @pytest.mark.unit
     def test_only_mathematical_characters_allowed(self, math_tools):
@@ -5,435 +5,520 @@ Unit tests for media analysis functionality in ScratchPadTools.
 
 import pytest
 import os
+import json
 import base64
-import tempfile
-from unittest.mock import Mock, patch, mock_open
-from tools import ScratchPadTools
+import asyncio
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch, AsyncMock
+from .conftest import vision_response
+
+
+# Large image payload and its expected encoding, computed once at import
+LARGE_IMAGE_DATA = b'large image data content ' * 1000
+LARGE_IMAGE_B64 = base64.b64encode(LARGE_IMAGE_DATA).decode('utf-8')
+
+
+@pytest.fixture(scope="module")
+def tools(scratch_pad_tools_class, mocked_openai, temp_scratchpad_file, temp_system_prompt_file):
+    """Create one ScratchPadTools instance, wired to the mocked vision client, for the whole module."""
+    return scratch_pad_tools_class(temp_scratchpad_file, temp_system_prompt_file)
+
+
+@pytest.fixture(scope="module")
+def large_image_file(tmp_path_factory):
+    """Write LARGE_IMAGE_DATA under an image extension once per module."""
+    image_file = tmp_path_factory.mktemp("large") / "large.png"
+    image_file.write_bytes(LARGE_IMAGE_DATA)
+    return str(image_file)
+
+
+@pytest.fixture
+def mock_vision_client(tools, mocked_openai):
+    """Return the shared tools and mocked vision client, reset for this test."""
+    tools.media_tools.cache_clear()
+    mocked_openai.chat.completions.create.reset_mock(side_effect=True)
+    mocked_openai.chat.completions.create.return_value = vision_response()
+    return tools, mocked_openai
 
 
 class TestMediaAnalysis:
     """Test media file analysis functionality."""
     
     @pytest.mark.unit
-    def test_analyze_media_file_image_success(self, temp_image_file, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_image_success(self, temp_image_file, mock_vision_client):
         """Test successful image analysis."""
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Mock successful vision API response
-            mock_response = Mock()
-            mock_response.choices = [Mock()]
-            mock_response.choices[0].message.content = "This is a test image showing a 1x1 pixel PNG file."
-            mock_client.chat.completions.create.return_value = mock_response
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            result = tools.analyze_media_file(temp_image_file)
-            
-            assert result["status"] == "success"
-            assert result["file_path"] == temp_image_file
-            assert result["file_type"] == "image"
-            assert result["analysis"] == "This is a test image showing a 1x1 pixel PNG file."
-            assert result["mime_type"] == "image/png"
-            
-            # Verify vision API was called with correct parameters
-            mock_client.chat.completions.create.assert_called_once()
-            call_args = mock_client.chat.completions.create.call_args
-            assert call_args[1]["model"] == "gpt-4o-mini"
-            
-            # Check that the image was included in the request
-            messages = call_args[1]["messages"]
-            assert len(messages) == 1
-            assert messages[0]["role"] == "user"
-            content = messages[0]["content"]
-            assert len(content) == 2  # Text and image
-            assert content[0]["type"] == "text"
-            assert content[1]["type"] == "image_url"
-            assert content[1]["image_url"]["url"].startswith("data:image/png;base64,")
+        tools, mock_client = mock_vision_client
+        
+        # Mock successful vision API response
+        mock_client.chat.completions.create.return_value = vision_response("This is a test image showing a 1x1 pixel PNG file.")
+        
+        result = tools.analyze_media_file(temp_image_file)
+        
+        assert result["status"] == "success"
+        assert result["file_path"] == temp_image_file
+        assert result["file_type"] == "image"
+        assert result["analysis"] == "This is a test image showing a 1x1 pixel PNG file."
+        assert result["mime_type"] == "image/png"
+        
+        # Verify vision API was called with correct parameters
+        mock_client.chat.completions.create.assert_called_once()
+        call_args = mock_client.chat.completions.create.call_args
+        assert call_args[1]["model"] == "gpt-4o-mini"
+        
+        # Check that the image was included in the request
+        messages = call_args[1]["messages"]
+        assert len(messages) == 1
+        assert messages[0]["role"] == "user"
+        content = messages[0]["content"]
+        assert len(content) == 2  # Text and image
+        assert content[0]["type"] == "text"
+        assert content[1]["type"] == "image_url"
+        assert content[1]["image_url"]["url"].startswith("data:image/png;base64,")
     
     @pytest.mark.unit
-    def test_analyze_media_file_not_found(self, temp_scratchpad_file, temp_system_prompt_file):
-        """Test handling of missing media file."""
-        nonexistent_file = "/nonexistent/image.png"
+    @pytest.mark.parametrize("method,prefix", [
+        ("analyze_media_file", "Media file not found: /nonexistent/image.png"),
+        ("_encode_image", "Error encoding image:")
+    ])
+    def test_missing_file_reports_error(self, tools, method, prefix):
+        """Test that analysis and encoding both report a missing media file."""
+        result = getattr(tools, method)("/nonexistent/image.png")
         
-        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            
-            result = tools.analyze_media_file(nonexistent_file)
-            
+        if isinstance(result, dict):
             assert result["status"] == "error"
-            assert f"Media file not found: {nonexistent_file}" in result["message"]
             assert result["analysis"] == ""
             assert result["file_type"] == "unknown"
+            result = result["message"]
+        
+        assert result.startswith(prefix)
     
     @pytest.mark.unit
-    def test_analyze_media_file_pdf(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_pdf(self, temp_pdf_file, tools):
         """Test handling of PDF files."""
-        # Create temporary PDF file
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
-            f.write(b'%PDF-1.4\ntest pdf content')
-            pdf_file = f.name
+        result = tools.analyze_media_file(temp_pdf_file)
         
-        try:
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                result = tools.analyze_media_file(pdf_file)
-                
-                assert result["status"] == "success"
-                assert result["file_path"] == pdf_file
-                assert result["file_type"] == "pdf"
-                assert "PDF file detected" in result["analysis"]
-                assert "not yet implemented for PDFs" in result["analysis"]
-                assert "text summary from the scratch pad" in result["recommendation"]
-        finally:
-            os.unlink(pdf_file)
+        assert result["status"] == "success"
+        assert result["file_path"] == temp_pdf_file
+        assert result["file_type"] == "pdf"
+        assert "PDF file detected" in result["analysis"]
+        assert "not yet implemented for PDFs" in result["analysis"]
+        assert "text summary from the scratch pad" in result["recommendation"]
     
     @pytest.mark.unit
-    def test_analyze_media_file_unsupported_type(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_unsupported_type(self, tmp_path, tools):
         """Test handling of unsupported file types."""
-        # Create temporary file with unsupported extension
-        with tempfile.NamedTemporaryFile(suffix='.xyz', delete=False) as f:
-            f.write(b'unsupported file content')
-            unsupported_file = f.name
+        # Create file with unsupported extension
+        unsupported_file = tmp_path / "test.xyz"
+        unsupported_file.write_bytes(b'unsupported file content')
         
-        try:
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                result = tools.analyze_media_file(unsupported_file)
-                
-                assert result["status"] == "error"
-                assert "Unsupported file type: .xyz" in result["message"]
-                assert result["analysis"] == ""
-                assert result["file_type"] == ".xyz"
-        finally:
-            os.unlink(unsupported_file)
+        result = tools.analyze_media_file(str(unsupported_file))
+        
+        assert result["status"] == "error"
+        assert "Unsupported file type: .xyz" in result["message"]
+        assert result["analysis"] == ""
+        assert result["file_type"] == ".xyz"
     
     @pytest.mark.unit
-    def test_analyze_media_file_different_image_formats(self, temp_scratchpad_file, temp_system_prompt_file):
+    @pytest.mark.parametrize("ext,expected_mime", [
+        ('.jpg', 'image/jpeg'),
+        ('.jpeg', 'image/jpeg'),
+        ('.gif', 'image/gif'),
+        ('.webp', 'image/webp')
+    ])
+    def test_analyze_media_file_different_image_formats(self, png_files_by_ext, mock_vision_client, ext, expected_mime):
         """Test handling of different image formats."""
-        formats_and_mimes = [
-            ('.jpg', 'image/jpeg'),
-            ('.jpeg', 'image/jpeg'),
-            ('.gif', 'image/gif'),
-            ('.webp', 'image/webp')
-        ]
+        tools, mock_client = mock_vision_client
+        mock_client.chat.completions.create.return_value = vision_response(f"Analysis of {ext} image")
         
-        # Simple 1x1 PNG data (we'll pretend it's different formats)
-        png_data = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+        # The same 1x1 PNG data is stored under each extension
+        result = tools.analyze_media_file(png_files_by_ext[ext])
         
-        for ext, expected_mime in formats_and_mimes:
-            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
-                f.write(png_data)
-                test_file = f.name
-            
-            try:
-                with patch('tools.OpenAI') as mock_openai:
-                    mock_client = Mock()
-                    mock_openai.return_value = mock_client
-                    
-                    mock_response = Mock()
-                    mock_response.choices = [Mock()]
-                    mock_response.choices[0].message.content = f"Analysis of {ext} image"
-                    mock_client.chat.completions.create.return_value = mock_response
-                    
-                    tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                    tools.client = mock_client
-                    
-                    result = tools.analyze_media_file(test_file)
-                    
-                    assert result["status"] == "success"
-                    assert result["file_type"] == "image"
-                    assert result["mime_type"] == expected_mime
-                    
-                    # Verify correct MIME type in API call
-                    call_args = mock_client.chat.completions.create.call_args
-                    image_url = call_args[1]["messages"][0]["content"][1]["image_url"]["url"]
-                    assert image_url.startswith(f"data:{expected_mime};base64,")
-            finally:
-                os.unlink(test_file)
+        assert result["status"] == "success"
+        assert result["file_type"] == "image"
+        assert result["mime_type"] == expected_mime
+        
+        # Verify correct MIME type in API call
+        call_args = mock_client.chat.completions.create.call_args
+        image_url = call_args[1]["messages"][0]["content"][1]["image_url"]["url"]
+        assert image_url.startswith(f"data:{expected_mime};base64,")
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("path,expected", [
+        ("photo.JPG", ".jpg"),
+        ("/tmp/archive.tar.gz", ".gz"),
+        ("/tmp/v1.2/photo", ""),
+        ("photo", ""),
+    ])
+    def test_file_extension(self, path, expected):
+        """Test that extensions are lower-cased and dotted directories are ignored."""
+        from tools.media_tools import _file_extension
+        
+        assert _file_extension(path) == expected
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("question,expected", [
+        ("How many dogs are there?", "Please count and provide the exact number"),
+        ("What colors stand out?", "describing the colors"),
+        ("Where is the ball?", "locations and positions"),
+        ("Describe the scene", "detailed description focusing on"),
+        ("Is it sunny?", "focus on answering their specific question"),
+        (None, "Analyze this image in detail.")
+    ])
+    def test_analysis_prompt_follows_question(self, temp_image_file, mock_vision_client, question, expected):
+        """Test that the vision prompt is chosen from the user's question."""
+        tools, mock_client = mock_vision_client
+        
+        tools.media_tools.analyze_media_file(temp_image_file, question)
+        
+        prompt = mock_client.chat.completions.create.call_args[1]["messages"][0]["content"][0]["text"]
+        assert expected in prompt
+        if question:
+            assert prompt.startswith(f"The user is asking: '{question}'.")
     
     @pytest.mark.unit
-    def test_analyze_media_file_openai_api_error(self, temp_image_file, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_openai_api_error(self, temp_image_file, mock_vision_client):
         """Test handling of OpenAI API errors during image analysis."""
-        with patch('tools.OpenAI') as mock_openai:
-            mock_client = Mock()
-            mock_openai.return_value = mock_client
-            
-            # Mock API error
-            mock_client.chat.completions.create.side_effect = Exception("Vision API rate limit exceeded")
-            
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            tools.client = mock_client
-            
-            result = tools.analyze_media_file(temp_image_file)
-            
-            assert result["status"] == "error"
-            assert "Vision API rate limit exceeded" in result["message"]
-            assert result["analysis"] == ""
-            assert result["file_type"] == "image"
+        tools, mock_client = mock_vision_client
+        
+        # Mock API error
+        mock_client.chat.completions.create.side_effect = Exception("Vision API rate limit exceeded")
+        
+        result = tools.analyze_media_file(temp_image_file)
+        
+        assert result["status"] == "error"
+        assert "Vision API rate limit exceeded" in result["message"]
+        assert result["analysis"] == ""
+        assert result["file_type"] == "image"
     
     @pytest.mark.unit
-    def test_analyze_media_file_general_exception(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_general_exception(self, tmp_path, mock_vision_client):
         """Test handling of general exceptions during media analysis."""
+        tools, _ = mock_vision_client
+        
         # Create a file that exists but will cause an error during processing
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
-            f.write(b'invalid image data')
-            invalid_image = f.name
+        invalid_image = tmp_path / "invalid.png"
+        invalid_image.write_bytes(b'invalid image data')
         
-        try:
-            with patch('tools.OpenAI') as mock_openai:
-                mock_client = Mock()
-                mock_openai.return_value = mock_client
-                
-                # Mock the _encode_image method to raise an exception
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                tools.client = mock_client
-                
-                with patch.object(tools, '_encode_image', side_effect=Exception("Image encoding failed")):
-                    result = tools.analyze_media_file(invalid_image)
-                    
-                    assert result["status"] == "error"
-                    assert "Error analyzing media file" in result["message"]
-                    assert "Image encoding failed" in result["message"]
-                    assert result["analysis"] == ""
-                    assert result["file_type"] == "unknown"
-        finally:
-            os.unlink(invalid_image)
+        # The wrapper delegates to the manager's MediaTools, so patch the encoder there
+        with patch.object(tools.media_tools, '_encode_image', side_effect=Exception("Image encoding failed")):
+            result = tools.analyze_media_file(str(invalid_image))
+            
+            assert result["status"] == "error"
+            assert result["message"] == "Error analyzing image: Image encoding failed"
+            assert result["analysis"] == ""
+            assert result["file_type"] == "image"
 
 
 class TestImageEncoding:
     """Test image encoding functionality."""
     
     @pytest.mark.unit
-    def test_encode_image_success(self, temp_image_file, temp_scratchpad_file, temp_system_prompt_file):
+    def test_encode_image_success(self, temp_image_file, png_sample_b64, tools):
         """Test successful image encoding to base64."""
-        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            
-            encoded = tools._encode_image(temp_image_file)
-            
-            # Should not start with "Error"
-            assert not encoded.startswith("Error")
-            
-            # Should be valid base64
-            try:
-                decoded = base64.b64decode(encoded)
-                assert len(decoded) > 0
-            except Exception:
-                pytest.fail("Encoded result is not valid base64")
-    
-    @pytest.mark.unit
-    def test_encode_image_file_not_found(self, temp_scratchpad_file, temp_system_prompt_file):
-        """Test image encoding with missing file."""
-        nonexistent_file = "/nonexistent/image.png"
+        encoded = tools._encode_image(temp_image_file)
         
-        with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-            tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-            
-            result = tools._encode_image(nonexistent_file)
-            
-            assert result.startswith("Error encoding image:")
+        assert encoded == png_sample_b64
     
     @pytest.mark.unit
-    def test_encode_image_permission_error(self, temp_scratchpad_file, temp_system_prompt_file):
+    @pytest.mark.skipif(os.name == 'nt' or os.geteuid() == 0, reason="chmod 000 does not block reads on Windows or as root")
+    def test_encode_image_permission_error(self, tmp_path, tools):
         """Test image encoding with permission error."""
         # Create a file and then make it unreadable
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
-            f.write(b'test data')
-            restricted_file = f.name
+        restricted_file = tmp_path / "restricted.png"
+        restricted_file.write_bytes(b'test data')
         
         try:
             # Make file unreadable
             os.chmod(restricted_file, 0o000)
             
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                result = tools._encode_image(restricted_file)
-                
-                assert result.startswith("Error encoding image:")
+            result = tools._encode_image(str(restricted_file))
+            
+            assert result.startswith("Error encoding image:")
         finally:
-            # Restore permissions and cleanup
+            # Restore permissions so tmp_path can be cleaned up
             os.chmod(restricted_file, 0o644)
-            os.unlink(restricted_file)
     
     @pytest.mark.unit
-    def test_encode_image_empty_file(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_encode_image_empty_file(self, tmp_path, tools):
         """Test image encoding with empty file."""
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
-            # Empty file
-            empty_file = f.name
+        empty_file = tmp_path / "empty.png"
+        empty_file.write_bytes(b'')
+        with patch('tools.media_tools.open', wraps=open, create=True) as opened:
+            encoded = tools._encode_image(str(empty_file))
         
-        try:
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                encoded = tools._encode_image(empty_file)
-                
-                # Should succeed with empty file (base64 of empty bytes)
-                assert not encoded.startswith("Error")
-                assert encoded == ""  # base64 of empty bytes
-        finally:
-            os.unlink(empty_file)
+        opened.assert_called_once_with(str(empty_file), "rb")
+        
+        # Should succeed with empty file (base64 of empty bytes)
+        assert not encoded.startswith("Error")
+        assert encoded == ""  # base64 of empty bytes
     
     @pytest.mark.unit
-    def test_encode_image_large_file(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_encode_image_large_file(self, large_image_file, tools):
         """Test image encoding with large file."""
-        # Create a larger test file
-        large_data = b'large image data content ' * 1000
+        with patch('tools.media_tools.open', wraps=open, create=True) as opened:
+            encoded = tools._encode_image(large_image_file)
         
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
-            f.write(large_data)
-            large_file = f.name
+        # Pillow reads the image header from the same handle
+        opened.assert_called_once_with(large_image_file, "rb")
         
-        try:
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                encoded = tools._encode_image(large_file)
-                
-                assert not encoded.startswith("Error")
-                
-                # Verify it's valid base64 and decodes to original data
-                decoded = base64.b64decode(encoded)
-                assert decoded == large_data
-        finally:
-            os.unlink(large_file)
+        assert encoded == LARGE_IMAGE_B64
+    
+    @pytest.mark.unit
+    @pytest.mark.parametrize("size,expected", [
+        ((3000, 1500), (1536, 768)),
+        ((800, 4000), (410, 2048)),
+        ((500, 400), (500, 400))
+    ])
+    def test_encode_image_downscales_to_api_size(self, tmp_path, monkeypatch, tools, size, expected):
+        """Test that large images are shrunk to the size the API would use, and small ones sent as is."""
+        Image = pytest.importorskip("PIL.Image")
+        image_file = tmp_path / "photo.png"
+        Image.new("RGB", size, "green").save(image_file, format="PNG")
+        
+        encoded = tools._encode_image(str(image_file))
+        with Image.open(BytesIO(base64.b64decode(encoded))) as sent:
+            assert sent.size == expected
+            assert sent.format == "PNG"
+        if size == expected:
+            assert base64.b64decode(encoded) == image_file.read_bytes()
+        
+        # Without Pillow the file is sent unchanged
+        monkeypatch.setattr('tools.media_tools.Image', None)
+        assert base64.b64decode(tools._encode_image(str(image_file))) == image_file.read_bytes()
+    
+    @pytest.mark.unit
+    def test_encode_image_downscale_keeps_exif_orientation(self, tmp_path, tools):
+        """Test that a rotated phone photo is sent upright after downscaling."""
+        Image = pytest.importorskip("PIL.Image")
+        image_file = tmp_path / "phone.jpg"
+        # Stored landscape with the left half red; Orientation 6 displays it
+        # rotated a quarter turn clockwise, so the red half ends up on top
+        stored = Image.new("RGB", (3000, 1500), "blue")
+        stored.paste("red", (0, 0, 1500, 1500))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        stored.save(image_file, format="JPEG", exif=exif)
+        
+        with Image.open(BytesIO(base64.b64decode(tools._encode_image(str(image_file))))) as sent:
+            assert sent.size == (768, 1536)
+            assert sent.getexif().get(0x0112, 1) == 1
+            red, green, blue = sent.getpixel((384, 100))
+            assert red > 200 and blue < 60
+    
+    @pytest.mark.unit
+    def test_encode_image_keeps_animations_whole(self, tmp_path, tools):
+        """Test that a large animated GIF is sent unchanged rather than cut to its first frame."""
+        Image = pytest.importorskip("PIL.Image")
+        image_file = tmp_path / "animation.gif"
+        frames = [Image.new("RGB", (3000, 1000), color) for color in ("red", "blue")]
+        frames[0].save(image_file, format="GIF", save_all=True, append_images=frames[1:])
+        
+        assert base64.b64decode(tools._encode_image(str(image_file))) == image_file.read_bytes()
+    
+    @pytest.mark.unit
+    def test_encode_image_across_chunks(self, large_image_file, tools):
+        """Test that chunked encoding matches encoding the whole file at once."""
+        with patch('tools.media_tools.ENCODE_CHUNK_SIZE', 3 * 7):
+            encoded = tools._encode_image(large_image_file)
+        
+        assert encoded == LARGE_IMAGE_B64
 
 
 class TestMediaAnalysisEdgeCases:
     """Test edge cases and boundary conditions for media analysis."""
     
     @pytest.mark.unit
-    def test_analyze_media_file_unicode_filename(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_unicode_filename(self, unicode_png_path, mock_vision_client):
         """Test handling of files with Unicode characters in filename."""
-        unicode_filename = "测试图片_émoji🖼️.png"
-        png_data = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+        tools, mock_client = mock_vision_client
+        mock_client.chat.completions.create.return_value = vision_response("Unicode filename image analysis")
         
-        # Create file with Unicode name in temp directory
-        import tempfile
-        temp_dir = tempfile.mkdtemp()
-        unicode_file = os.path.join(temp_dir, unicode_filename)
+        result = tools.analyze_media_file(unicode_png_path)
         
-        try:
-            with open(unicode_file, 'wb') as f:
-                f.write(png_data)
-            
-            with patch('tools.OpenAI') as mock_openai:
-                mock_client = Mock()
-                mock_openai.return_value = mock_client
-                
-                mock_response = Mock()
-                mock_response.choices = [Mock()]
-                mock_response.choices[0].message.content = "Unicode filename image analysis"
-                mock_client.chat.completions.create.return_value = mock_response
-                
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                tools.client = mock_client
-                
-                result = tools.analyze_media_file(unicode_file)
-                
-                assert result["status"] == "success"
-                assert result["file_path"] == unicode_file
-                assert unicode_filename in result["file_path"]
-        finally:
-            if os.path.exists(unicode_file):
-                os.unlink(unicode_file)
-            os.rmdir(temp_dir)
+        assert result["status"] == "success"
+        assert result["file_path"] == unicode_png_path
+        assert "测试图片_émoji🖼️.png" in result["file_path"]
     
     @pytest.mark.unit
-    def test_analyze_media_file_very_long_path(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_very_long_path(self, long_png_path, mock_vision_client):
         """Test handling of files with very long paths."""
-        # Create nested directory structure
-        import tempfile
-        base_temp = tempfile.mkdtemp()
-        
-        # Create deep nested structure
-        long_path_parts = ["very", "long", "path", "structure"] * 10
-        current_path = base_temp
-        for part in long_path_parts:
-            current_path = os.path.join(current_path, part)
-            os.makedirs(current_path, exist_ok=True)
+        tools, mock_client = mock_vision_client
+        mock_client.chat.completions.create.return_value = vision_response("Long path image analysis")
         
-        long_file = os.path.join(current_path, "test.png")
-        png_data = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+        result = tools.analyze_media_file(long_png_path)
         
-        try:
-            with open(long_file, 'wb') as f:
-                f.write(png_data)
-            
-            with patch('tools.OpenAI') as mock_openai:
-                mock_client = Mock()
-                mock_openai.return_value = mock_client
-                
-                mock_response = Mock()
-                mock_response.choices = [Mock()]
-                mock_response.choices[0].message.content = "Long path image analysis"
-                mock_client.chat.completions.create.return_value = mock_response
-                
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                tools.client = mock_client
-                
-                result = tools.analyze_media_file(long_file)
-                
-                assert result["status"] == "success"
-                assert result["file_path"] == long_file
-        finally:
-            # Cleanup deep directory structure
-            import shutil
-            shutil.rmtree(base_temp, ignore_errors=True)
+        assert result["status"] == "success"
+        assert result["file_path"] == long_png_path
     
     @pytest.mark.unit
-    def test_analyze_media_file_case_insensitive_extensions(self, temp_scratchpad_file, temp_system_prompt_file):
+    @pytest.mark.parametrize("ext", ['.PNG', '.Jpg', '.JPEG', '.GiF', '.WebP'])
+    def test_analyze_media_file_case_insensitive_extensions(self, png_files_by_ext, mock_vision_client, ext):
         """Test handling of case-insensitive file extensions."""
-        case_variations = ['.PNG', '.Jpg', '.JPEG', '.GiF', '.WebP']
-        png_data = b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89\x00\x00\x00\nIDATx\x9cc\x00\x01\x00\x00\x05\x00\x01\r\n-\xdb\x00\x00\x00\x00IEND\xaeB`\x82'
+        tools, mock_client = mock_vision_client
+        mock_client.chat.completions.create.return_value = vision_response(f"Analysis of {ext} file")
         
-        for ext in case_variations:
-            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
-                f.write(png_data)
-                test_file = f.name
-            
-            try:
-                with patch('tools.OpenAI') as mock_openai:
-                    mock_client = Mock()
-                    mock_openai.return_value = mock_client
-                    
-                    mock_response = Mock()
-                    mock_response.choices = [Mock()]
-                    mock_response.choices[0].message.content = f"Analysis of {ext} file"
-                    mock_client.chat.completions.create.return_value = mock_response
-                    
-                    tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                    tools.client = mock_client
-                    
-                    result = tools.analyze_media_file(test_file)
-                    
-                    # Should be recognized as image regardless of case
-                    assert result["status"] == "success"
-                    assert result["file_type"] == "image"
-            finally:
-                os.unlink(test_file)
+        result = tools.analyze_media_file(png_files_by_ext[ext])
+        
+        # Should be recognized as image regardless of case
+        assert result["status"] == "success"
+        assert result["file_type"] == "image"
     
     @pytest.mark.unit
-    def test_analyze_media_file_with_no_extension(self, temp_scratchpad_file, temp_system_prompt_file):
+    def test_analyze_media_file_with_no_extension(self, tmp_path, tools):
         """Test handling of files with no extension."""
-        with tempfile.NamedTemporaryFile(suffix='', delete=False) as f:
-            f.write(b'some file content')
-            no_ext_file = f.name
+        no_ext_file = tmp_path / "no_extension"
+        no_ext_file.write_bytes(b'some file content')
         
-        try:
-            with patch.dict(os.environ, {'OPENAI_API_KEY': 'test-key'}):
-                tools = ScratchPadTools(temp_scratchpad_file, temp_system_prompt_file)
-                
-                result = tools.analyze_media_file(no_ext_file)
-                
-                # Should be treated as unsupported type
-                assert result["status"] == "error"
-                assert "Unsupported file type:" in result["message"]
-        finally:
-            os.unlink(no_ext_file) 
\ No newline at end of file
+        result = tools.analyze_media_file(str(no_ext_file))
+        
+        # Should be treated as unsupported type
+        assert result["status"] == "error"
+        assert "Unsupported file type:" in result["message"]
+
+
+class TestBatchedMediaAnalysis:
+    """Test analyzing several media files in one call."""
+    
+    @pytest.mark.unit
+    def test_analyze_media_files_keeps_input_order(self, temp_image_file, temp_pdf_file, mock_vision_client):
+        """Test that concurrent analysis returns one result per path, in order."""
+        tools, mock_client = mock_vision_client
+        
+        results = tools.analyze_media_files([temp_image_file, "/nonexistent/image.png", temp_pdf_file])
+        
+        assert [r["status"] for r in results] == ["success", "error", "success"]
+        assert [r["file_type"] for r in results] == ["image", "unknown", "pdf"]
+        assert mock_client.chat.completions.create.call_count == 1
+    
+    @pytest.mark.unit
+    def test_aanalyze_media_files_uses_async_client(self, png_files_by_ext, temp_pdf_file, mock_vision_client):
+        """Test that the async variant sends every image through the async client."""
+        tools, _ = mock_vision_client
+        paths = [png_files_by_ext['.jpg'], temp_pdf_file, png_files_by_ext['.gif']]
+        async_create = AsyncMock(return_value=vision_response("Async analysis"))
+        
+        with patch.object(tools.media_tools.aclient.chat.completions, 'create', async_create):
+            results = asyncio.run(tools.aanalyze_media_files(paths))
+        
+        assert [r["file_type"] for r in results] == ["image", "pdf", "image"]
+        assert [r.get("mime_type") for r in results] == ["image/jpeg", None, "image/gif"]
+        assert results[0]["analysis"] == "Async analysis"
+        assert async_create.await_count == 2
+    
+    @pytest.mark.unit
+    def test_submit_batch_and_wait_for_batch(self, temp_image_file, temp_pdf_file, mock_vision_client):
+        """Test the Batch API round trip from JSONL upload to collected analyses."""
+        tools, mock_client = mock_vision_client
+        media_tools = tools.media_tools
+        uploaded_lines = []
+        
+        def create_file(file, purpose):
+            assert purpose == "batch"
+            uploaded_lines.extend(json.loads(line) for line in file.read().decode('utf-8').splitlines())
+            return SimpleNamespace(id="file-in")
+        
+        mock_client.files.create.side_effect = create_file
+        mock_client.batches.create.return_value = SimpleNamespace(id="batch-1")
+        
+        submitted = media_tools.submit_batch([temp_image_file, temp_pdf_file])
+        
+        assert submitted["status"] == "success"
+        assert submitted["batch_id"] == "batch-1"
+        assert submitted["requests"] == {"media-0": temp_image_file}
+        assert submitted["skipped"][temp_pdf_file]["file_type"] == "pdf"
+        assert [line["custom_id"] for line in uploaded_lines] == ["media-0"]
+        assert uploaded_lines[0]["url"] == "/v1/chat/completions"
+        assert uploaded_lines[0]["body"]["model"] == "gpt-4o-mini"
+        mock_client.batches.create.assert_called_once_with(
+            input_file_id="file-in", endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        
+        mock_client.batches.retrieve.side_effect = [
+            SimpleNamespace(status="in_progress", output_file_id=None),
+            SimpleNamespace(status="completed", output_file_id="file-out")
+        ]
+        mock_client.files.content.return_value = SimpleNamespace(text=json.dumps({
+            "custom_id": "media-0",
+            "error": None,
+            "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "Batched analysis"}}]}}
+        }) + "\n")
+        
+        collected = media_tools.wait_for_batch("batch-1", submitted["requests"], poll_interval=0)
+        
+        assert collected["status"] == "success"
+        assert collected["results"][temp_image_file]["analysis"] == "Batched analysis"
+        assert collected["results"][temp_image_file]["mime_type"] == "image/png"
+        assert mock_client.batches.retrieve.call_count == 2
+        mock_client.files.content.assert_called_once_with("file-out")
+    
+    @pytest.mark.unit
+    def test_wait_for_batch_skips_malformed_lines(self, mock_vision_client):
+        """Test that a bad output line only costs its own file's result."""
+        tools, mock_client = mock_vision_client
+        requests = {"media-0": "a.png", "media-1": "b.png", "media-2": "c.png"}
+        mock_client.batches.retrieve.side_effect = None
+        mock_client.batches.retrieve.return_value = SimpleNamespace(status="completed", output_file_id="file-out")
+        mock_client.files.content.return_value = SimpleNamespace(text="\n".join([
+            '{"custom_id": "media-0", "response": {"status_code": 200, "bo',
+            json.dumps({"custom_id": "media-1", "response": {"status_code": 200, "body": {"choices": []}}}),
+            json.dumps({
+                "custom_id": "media-2",
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "Still collected"}}]}}
+            }),
+        ]))
+        
+        collected = tools.media_tools.wait_for_batch("batch-1", requests, poll_interval=0)
+        
+        assert collected["status"] == "success"
+        assert collected["results"]["a.png"]["message"] == "No result returned by the batch"
+        assert collected["results"]["b.png"]["status"] == "error"
+        assert collected["results"]["c.png"]["analysis"] == "Still collected"
+    
+    @pytest.mark.unit
+    def test_repeat_analysis_served_from_cache(self, tmp_path, png_sample_bytes, mock_vision_client):
+        """Test that an unchanged image is only sent once per question."""
+        tools, mock_client = mock_vision_client
+        image_file = tmp_path / "cached.png"
+        image_file.write_bytes(png_sample_bytes)
+        
+        first = tools.analyze_media_file(str(image_file))
+        second = tools.analyze_media_file(str(image_file))
+        assert first == second
+        assert mock_client.chat.completions.create.call_count == 1
+        
+        # A different question, or a changed file, is analyzed again
+        tools._manager.media_tools.analyze_media_file(str(image_file), "How many pixels?")
+        image_file.write_bytes(png_sample_bytes * 2)
+        tools.analyze_media_file(str(image_file))
+        assert mock_client.chat.completions.create.call_count == 3
+    
+    @pytest.mark.unit
+    def test_analyze_media_file_stats_once(self, temp_image_file, mock_vision_client):
+        """Test that one stat call serves both the existence check and the cache key."""
+        tools, _ = mock_vision_client
+        
+        with patch('tools.media_tools.os.stat', wraps=os.stat) as stat:
+            assert tools.analyze_media_file(temp_image_file)["status"] == "success"
+            assert tools.analyze_media_file(temp_image_file)["status"] == "success"
+        
+        assert [call.args for call in stat.call_args_list] == [(temp_image_file,), (temp_image_file,)]
+    
+    @pytest.mark.unit
+    def test_stream_image_analysis_yields_deltas(self, tmp_path, png_sample_bytes, mock_vision_client):
+        """Test that streamed analysis yields text as it arrives and caches the whole answer."""
+        tools, mock_client = mock_vision_client
+        image_file = tmp_path / "streamed.png"
+        image_file.write_bytes(png_sample_bytes)
+        mock_client.chat.completions.create.return_value = iter([
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            for text in ("A gorilla ", None, "dunking.")
+        ])
+        
+        assert list(tools.media_tools.stream_image_analysis(str(image_file))) == ["A gorilla ", "dunking."]
+        assert mock_client.chat.completions.create.call_args[1]["stream"] is True
+        
+        # The finished answer is cached for both paths
+        assert tools.analyze_media_file(str(image_file))["analysis"] == "A gorilla dunking."
+        assert list(tools.media_tools.stream_image_analysis(str(image_file))) == ["A gorilla dunking."]
+        assert mock_client.chat.completions.create.call_count == 1
@@ -31,14 +31,21 @@ except ImportError:
         but uses the new clean architecture under the hood.
         """
         
-        def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None):
-            """Initialize the tools using the new architecture."""
+        def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None,
+                     semantic_cache: bool = False, client=None, aclient=None, cache_dir: str = None):
+            """Initialize the tools using the new architecture.
+            
+            client and aclient, when given, replace the OpenAI clients the tools would build.
+            cache_dir, when given, keeps context and image analysis results on disk across runs.
+            """
             # Initialize the tool manager which coordinates all specialized tools
-            self._manager = ToolManager(scratchpad_file, system_prompt_file)
+            self._manager = ToolManager(scratchpad_file, system_prompt_file, semantic_cache=semantic_cache,
+                                        client=client, aclient=aclient, cache_dir=cache_dir)
             
-            # Maintain backward compatibility by exposing file paths
-            self.scratchpad_file = scratchpad_file or 'scratchpad.txt'
-            self.system_prompt_file = system_prompt_file or 'config/system_prompt.txt'
+            # Maintain backward compatibility by exposing the file paths the tools resolved,
+            # including the SCRATCHPAD_FILE and SYSTEM_PROMPT_FILE environment defaults
+            self.scratchpad_file = self._manager.scratchpad_tools.scratchpad_file
+            self.system_prompt_file = self._manager.scratchpad_tools.system_prompt_file
             
             # Expose the OpenAI client for backward compatibility
             self.client = self._manager.math_tools.client
@@ -47,9 +54,25 @@ except ImportError:
         # SCRATCHPAD CONTEXT METHODS
         # =============================================================================
         
-        def get_scratch_pad_context(self, query: str) -> Dict[str, Any]:
+        def get_scratch_pad_context(self, query: str, no_cache: bool = False,
+                                    full_context: bool = True) -> Dict[str, Any]:
             """Get relevant context from the scratch pad for a given query."""
-            return self._manager.execute_function("get_scratch_pad_context", query=query)
+            return self._manager.execute_function("get_scratch_pad_context", query=query, no_cache=no_cache,
+                                                  full_context=full_context)
+        
+        async def aget_scratch_pad_context(self, query: str, no_cache: bool = False,
+                                           full_context: bool = True) -> Dict[str, Any]:
+            """Async version of get_scratch_pad_context."""
+            return await self._manager.scratchpad_tools.aget_scratch_pad_context(query, no_cache=no_cache,
+                                                                                 full_context=full_context)
+        
+        def get_scratch_pad_context_batch(self, queries: List[str], no_cache: bool = False) -> List[Dict[str, Any]]:
+            """Get relevant context from the scratch pad for several queries at once."""
+            return self._manager.scratchpad_tools.get_scratch_pad_context_batch(queries, no_cache=no_cache)
+        
+        def cache_clear(self) -> None:
+            """Forget all cached context extraction results."""
+            self._manager.scratchpad_tools.cache_clear()
         
         def _load_scratchpad(self) -> str:
             """Load the scratch pad content from file."""
@@ -67,6 +90,14 @@ except ImportError:
             """Analyze a media file and return detailed description."""
             return self._manager.execute_function("analyze_media_file", file_path=file_path)
         
+        def analyze_media_files(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+            """Analyze several media files concurrently, returning results in input order."""
+            return self._manager.media_tools.analyze_media_files(file_paths)
+        
+        async def aanalyze_media_files(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+            """Async version of analyze_media_files."""
+            return await self._manager.media_tools.aanalyze_media_files(file_paths)
+        
         def _encode_image(self, image_path: str) -> str:
             """Encode image to base64 for OpenAI API."""
             return self._manager.media_tools._encode_image(image_path)
@@ -166,4 +197,4 @@ __all__ = [
 
 # Function schemas for OpenAI function calling - now generated from ToolManager
 # Use "chat" format for backward compatibility with existing tests and code
-FUNCTION_SCHEMAS = ToolManager().get_function_schemas("chat") 
\ No newline at end of file
+FUNCTION_SCHEMAS = ToolManager.get_function_schemas("chat") 
\ No newline at end of file
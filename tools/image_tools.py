@@ -8,7 +8,7 @@ Single responsibility: image generation and prompt optimization only.
 
 import os
 import uuid
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from dotenv import load_dotenv
 from openai import OpenAI
 
@@ -16,17 +16,23 @@ from openai import OpenAI
 class ImageTools:
     """Focused image generation functionality."""
     
-    def __init__(self):
-        """Initialize the image generation tools."""
+    def __init__(self, client: Optional[OpenAI] = None):
+        """Initialize the image generation tools.
+        
+        Args:
+            client: OpenAI client to use instead of building one from OPENAI_API_KEY
+        """
         # Load environment variables
         load_dotenv()
         
         # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        if client is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            client = OpenAI(api_key=api_key)
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = client
         
         # Ensure media directory exists
         self.media_dir = "media"
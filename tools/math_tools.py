@@ -9,65 +9,358 @@ Focused on single responsibility: mathematical computation only.
 import os
 import json
 import re
-from typing import Dict, Any, List, Optional
+import ast
+import math
+import string
+import operator
+import functools
+from fractions import Fraction
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 from openai import OpenAI
+from .text_utils import read_text
 import sympy
 
+try:
+    import orjson
+except ImportError:
+    # Without orjson the routing reply is parsed by the stdlib json module
+    orjson = None
+
+
+# Translation table deleting every character allowed in an expression; whatever
+# survives str.translate is invalid, found in a single C-level pass
+_ALLOWED_CHARS_TABLE = str.maketrans('', '', string.ascii_letters + string.digits + string.whitespace + '+-*/()^=.,_')
+
+# Prompt given to the routing LLM by solve_math
+MATH_ROUTING_PROMPT_FILE = 'config/math_routing_prompt.txt'
+
+# Operations the routing LLM may choose between
+MATH_OPERATIONS = (
+    "solve_equation",
+    "simplify_expression",
+    "calculate_derivative",
+    "calculate_integral",
+    "factor_expression",
+    "calculate_complex_arithmetic",
+)
+
+# Structured output format for the routing call; the API only returns JSON matching this schema
+MATH_ROUTING_FORMAT = {
+    "type": "json_schema",
+    "name": "math_routing",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "operation": {"type": "string", "enum": list(MATH_OPERATIONS)},
+            "needs_context": {"type": "boolean"},
+        },
+        "required": ["operation", "needs_context"],
+        "additionalProperties": False,
+    },
+}
+
+# Patterns used by the expression parser, compiled once at import
+_DIGIT_VARIABLE_RE = re.compile(r'(\d)([a-zA-Z])(?![a-zA-Z])')
+_PAREN_VARIABLE_RE = re.compile(r'\)([a-zA-Z])(?![a-zA-Z])')
+_VARIABLE_PAREN_RE = re.compile(r'(?<![a-zA-Z])([a-zA-Z])\(')
+
+# Anything calculate_complex_arithmetic does not accept as plain arithmetic
+_NON_ARITHMETIC_RE = re.compile(r'[^0-9+\-*/().\s]')
+
+# Markdown code fence the routing LLM sometimes wraps its JSON reply in
+_JSON_FENCE_RE = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL)
+
+# Patterns used by the solve_math parameter extractors, compiled once at import
+_EQUATION_VERB_RE = re.compile(r'^(solve|find|what is|calculate)\s+')
+_EQUATION_NOUN_RE = re.compile(r'^(for|the\s+)?(equation|expression)\s+')
+_EQUATION_FOR_RE = re.compile(r'^for\s+')
+_EQUATION_RE = re.compile(r'([0-9a-zA-Z+\-*/^=().\s]+)')
+_EXPRESSION_PREFIX_RES = (
+    re.compile(r'^(simplify|derivative of|differentiate|integrate|factor|factorize)\s+'),
+    re.compile(r'^(find the|calculate the|what is the)\s+'),
+    re.compile(r'^(the\s+)?(derivative|integral|factor)\s+of\s+'),
+)
+_EXPRESSION_RE = re.compile(r'([0-9a-zA-Z+\-*/^().\s,sin|cos|tan|log|exp|sqrt]+)')
+# Must start at a number or bracket, so the whitespace before it is not taken for the expression
+_ARITHMETIC_RE = re.compile(r'(-?[0-9(][0-9+\-*/().\s]*)')
+_RESPECT_TO_RE = re.compile(r'with respect to (\w+)')
+# A standalone differential such as "dx"; "d" inside a word like "definite" is not one
+_DIFFERENTIAL_RE = re.compile(r'(?<![a-zA-Z])d([a-z])(?![a-zA-Z])')
+# A single letter used as a symbol in the expression: after a digit, bracket or
+# operator ("2x", "cos(y)") or right before one ("x^2"), but not inside a word
+_BARE_VARIABLE_RE = re.compile(r'(?:(?<=[\d(*+\-/^])|(?<![a-zA-Z])(?=[a-z][)*+\-/^]))([a-z])(?![a-zA-Z])')
+# Checked in order; a None order means the order is the captured number
+_DERIVATIVE_ORDER_RES = (
+    (re.compile(r'(\d+)(?:st|nd|rd|th)?\s+derivative'), None),
+    (re.compile(r'second derivative'), 2),
+    (re.compile(r'third derivative'), 3),
+)
+_INTEGRAL_LIMITS_RES = (
+    re.compile(r'from\s+(\S+?)\s+to\s+([^\s,]+)'),
+    re.compile(r'between\s+(\S+?)\s+and\s+([^\s,]+)'),
+    re.compile(r'\[([^,]+),\s*([^\]]+)\]'),
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_expression_cached(expression: str) -> Tuple[Optional[sympy.Basic], Optional[str]]:
+    """Safely parse a mathematical expression using SymPy with controlled transformations.
+    
+    Parsed expressions are immutable, so results are memoized per input string.
+    Failures are memoized too: they are returned as an error message instead of
+    raised, since lru_cache does not cache exceptions.
+    
+    Returns:
+        Tuple of (parsed expression, None) on success or (None, error message) on failure
+    """
+    try:
+        # Check for obviously invalid patterns first
+        if not expression or not expression.strip():
+            raise ValueError("Empty expression")
+        
+        # Check for invalid characters that shouldn't be in mathematical expressions
+        invalid_chars = {char for char in expression.translate(_ALLOWED_CHARS_TABLE) if not char.isspace()}
+        if invalid_chars:
+            raise ValueError(f"Invalid characters found: {invalid_chars}")
+        
+        # Clean the expression for common mathematical notations
+        cleaned_expr = expression.strip()
+        
+        # Convert x^2 to x**2 (exponentiation)
+        cleaned_expr = cleaned_expr.replace('^', '**')
+        
+        # Handle implicit multiplication: 3x -> 3*x, but NOT sin(x) -> sin*(x)
+        # Pattern: digit followed immediately by single letter (variable)
+        cleaned_expr = _DIGIT_VARIABLE_RE.sub(r'\1*\2', cleaned_expr)
+        
+        # Pattern: closing parenthesis followed by single letter (variable): )x -> )*x
+        cleaned_expr = _PAREN_VARIABLE_RE.sub(r')*\1', cleaned_expr)
+        
+        # Pattern: single letter followed by opening parenthesis (NOT function names): x( -> x*(
+        # But preserve sin(, cos(, etc. by ensuring the letter is not part of a function name
+        cleaned_expr = _VARIABLE_PAREN_RE.sub(r'\1*(', cleaned_expr)
+        
+        # Use SymPy's parse_expr with minimal transformations for security
+        parsed_expr = sympy.parse_expr(
+            cleaned_expr, 
+            transformations="all",
+            evaluate=True
+        )
+        return parsed_expr, None
+    except Exception as e:
+        return None, f"Invalid mathematical expression: {e}"
+
+
+def _parse_expression(expression: str) -> sympy.Basic:
+    """Parse an expression through the cache, raising ValueError if it is invalid."""
+    parsed_expr, error = _parse_expression_cached(expression)
+    if error:
+        raise ValueError(error)
+    return parsed_expr
+
+
+@functools.lru_cache(maxsize=64)
+def _get_symbol(name: str) -> sympy.Symbol:
+    """Return the SymPy symbol for a variable name, memoized per name."""
+    return sympy.Symbol(name)
+
+
+@functools.lru_cache(maxsize=512)
+def _derivative_cached(expression: str, variable: str, order: int) -> sympy.Basic:
+    """Differentiate an expression string, memoized on (expression, variable, order)."""
+    return sympy.diff(_parse_expression(expression), _get_symbol(variable), order)
+
+
+@functools.lru_cache(maxsize=512)
+def _integral_cached(expression: str, variable: str, limits: Optional[Tuple] = None) -> sympy.Basic:
+    """Integrate an expression string, memoized on (expression, variable, limits)."""
+    expr = _parse_expression(expression)
+    var = _get_symbol(variable)
+    if limits:
+        lower, upper = limits
+        return sympy.integrate(expr, (var, lower, upper))
+    return sympy.integrate(expr, var)
+
+
+def _is_trivially_simplified(expr: sympy.Basic) -> bool:
+    """Return True for expressions sympy.simplify cannot shorten (atoms and linear polynomials).
+    
+    Only sums written out as constant-times-atom terms count: SymPy already
+    combines like terms in those, while a polynomial such as (x + 1)**2 - x**2
+    is linear only once it is expanded and still needs simplifying.
+    """
+    if expr.is_Atom:
+        return True
+    terms = expr.args if expr.is_Add else (expr,)
+    return all(term.as_coeff_Mul()[1].is_Atom for term in terms)
+
+
+@functools.lru_cache(maxsize=256)
+def _simplify_cached(expr: sympy.Basic) -> sympy.Basic:
+    """Simplify an expression, memoized on the (hashable) expression itself."""
+    return sympy.simplify(expr)
+
+
+# Results with at most this many operations are returned as-is by _maybe_simplify
+_SIMPLIFY_MIN_OPS = 4
+
+
+def _maybe_simplify(expr: sympy.Basic) -> sympy.Basic:
+    """Simplify expr only when it is large enough that simplify() could plausibly shorten it."""
+    if sympy.count_ops(expr) <= _SIMPLIFY_MIN_OPS:
+        return expr
+    return _simplify_cached(expr)
+
+
+# Operators the arithmetic fast path evaluates natively; anything else goes to SymPy
+_ARITHMETIC_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Pow: operator.pow,
+}
+
+# Upper bound on the estimated size of an exact power computed by the fast path
+_MAX_EXACT_POWER_BITS = 100_000
+
+
+def _evaluate_arithmetic_node(node: ast.AST):
+    """Recursively evaluate a numeric AST node, raising ValueError on anything unsupported.
+    
+    Integer-only arithmetic stays exact (division yields a Fraction), matching SymPy's
+    rationals; once a decimal literal is involved the value is a native float.
+    """
+    if isinstance(node, ast.Expression):
+        return _evaluate_arithmetic_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        operand = _evaluate_arithmetic_node(node.operand)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC_BINOPS:
+        left = _evaluate_arithmetic_node(node.left)
+        right = _evaluate_arithmetic_node(node.right)
+        exact = not isinstance(left, float) and not isinstance(right, float)
+        if isinstance(node.op, ast.Pow):
+            # Only integer exponents; roots are left to SymPy
+            if isinstance(right, float) or right.denominator != 1:
+                raise ValueError("Non-integer exponent")
+            # SymPy evaluates x**0 to an exact 1, even for a Float base
+            if right == 0:
+                return 1
+            if exact:
+                left = Fraction(left)
+                # Leave enormous exact powers to SymPy rather than computing them here
+                size = left.numerator.bit_length() + left.denominator.bit_length()
+                if size * abs(int(right)) > _MAX_EXACT_POWER_BITS:
+                    raise ValueError("Exact power too large")
+                return left ** int(right)
+            result = left ** int(right)
+            if result == 0 and left != 0:
+                # Underflowed to 0.0, where SymPy keeps the tiny Float
+                raise ValueError("Float power underflow")
+            return result
+        # SymPy folds products with a zero factor to an exact Zero, even when the
+        # zero is a Float
+        if isinstance(node.op, ast.Mult) and (left == 0 or right == 0):
+            return 0
+        if isinstance(node.op, ast.Div) and left == 0 and right != 0:
+            return 0
+        if isinstance(node.op, ast.Div) and exact:
+            return Fraction(left, right)
+        # SymPy floors a float quotient to an exact Integer; leave that rounding to it
+        if isinstance(node.op, ast.FloorDiv) and not exact:
+            raise ValueError("Float floor division")
+        result = _ARITHMETIC_BINOPS[type(node.op)](left, right)
+        # Likewise a sum that cancels to 0.0 becomes an exact Zero
+        return 0 if result == 0 else result
+    raise ValueError(f"Unsupported node: {type(node).__name__}")
+
+
+def _evaluate_arithmetic_fast(expression: str) -> Optional[Any]:
+    """Evaluate plain numeric arithmetic without SymPy.
+    
+    Returns:
+        int, float or exact fraction string, as calculate_complex_arithmetic produces
+        via SymPy, or None if the expression needs the SymPy path
+    """
+    try:
+        value = _evaluate_arithmetic_node(ast.parse(expression.strip(), mode="eval"))
+    except (SyntaxError, ValueError, ArithmeticError, RecursionError):
+        return None
+    
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    
+    value = Fraction(value)
+    return int(value) if value.denominator == 1 else str(value)
+
 
 class MathTools:
     """Focused mathematical operations using SymPy."""
     
-    def __init__(self):
-        """Initialize the mathematical tools."""
+    def __init__(self, client: Optional[OpenAI] = None):
+        """Initialize the mathematical tools.
+        
+        Args:
+            client: OpenAI client to use instead of building one from OPENAI_API_KEY
+        """
         # Load environment variables
         load_dotenv()
         
         # Initialize OpenAI client for routing
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        if client is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            client = OpenAI(api_key=api_key)
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = client
+    
+    def _load_prompt(self, path: str) -> str:
+        """Load a prompt file through the shared file cache, re-read only when it changes."""
+        prompt = read_text(path)
+        if prompt is None:
+            raise FileNotFoundError(path)
+        return prompt
     
     def _parse_expression_safely(self, expression: str) -> sympy.Basic:
         """Safely parse a mathematical expression using SymPy with controlled transformations."""
-        try:
-            # Check for obviously invalid patterns first
-            if not expression or not expression.strip():
-                raise ValueError("Empty expression")
-            
-            # Check for invalid characters that shouldn't be in mathematical expressions
-            invalid_chars = re.findall(r'[^a-zA-Z0-9+\-*/()^=\s\.,_]', expression)
-            if invalid_chars:
-                raise ValueError(f"Invalid characters found: {set(invalid_chars)}")
-            
-            # Clean the expression for common mathematical notations
-            cleaned_expr = expression.strip()
-            
-            # Convert x^2 to x**2 (exponentiation)
-            cleaned_expr = re.sub(r'\^', '**', cleaned_expr)
-            
-            # Handle implicit multiplication: 3x -> 3*x, but NOT sin(x) -> sin*(x)
-            # Pattern: digit followed immediately by single letter (variable)
-            cleaned_expr = re.sub(r'(\d)([a-zA-Z])(?![a-zA-Z])', r'\1*\2', cleaned_expr)
-            
-            # Pattern: closing parenthesis followed by single letter (variable): )x -> )*x
-            cleaned_expr = re.sub(r'\)([a-zA-Z])(?![a-zA-Z])', r')*\1', cleaned_expr)
+        return _parse_expression(expression)
+    
+    def solve_equation_raw(self, equation: str, variable: str = "x") -> List[sympy.Basic]:
+        """
+        Solve an algebraic equation and return the SymPy solution objects.
+        
+        Args:
+            equation: The equation to solve (e.g., "2*x + 3 = 7" or "x**2 - 4")
+            variable: The variable to solve for (default: "x")
             
-            # Pattern: single letter followed by opening parenthesis (NOT function names): x( -> x*(
-            # But preserve sin(, cos(, etc. by ensuring the letter is not part of a function name
-            cleaned_expr = re.sub(r'(?<![a-zA-Z])([a-zA-Z])\(', r'\1*(', cleaned_expr)
+        Returns:
+            List of SymPy expressions, one per solution
             
-            # Use SymPy's parse_expr with minimal transformations for security
-            parsed_expr = sympy.parse_expr(
-                cleaned_expr, 
-                transformations="all",
-                evaluate=True
-            )
-            return parsed_expr
-        except Exception as e:
-            raise ValueError(f"Invalid mathematical expression: {e}")
+        Raises:
+            ValueError: If the equation cannot be parsed
+        """
+        # Handle equations with = sign
+        if "=" in equation:
+            left, right = equation.split("=", 1)
+            left_expr = self._parse_expression_safely(left.strip())
+            right_expr = self._parse_expression_safely(right.strip())
+            expr = left_expr - right_expr
+        else:
+            # Assume equation equals zero
+            expr = self._parse_expression_safely(equation)
+        
+        # Define the variable
+        var = _get_symbol(variable)
+        
+        # Solve the equation
+        return sympy.solve(expr, var)
     
     def solve_equation(self, equation: str, variable: str = "x") -> Dict[str, Any]:
         """
@@ -81,21 +374,7 @@ class MathTools:
             Dict containing solutions and metadata
         """
         try:
-            # Handle equations with = sign
-            if "=" in equation:
-                left, right = equation.split("=", 1)
-                left_expr = self._parse_expression_safely(left.strip())
-                right_expr = self._parse_expression_safely(right.strip())
-                expr = left_expr - right_expr
-            else:
-                # Assume equation equals zero
-                expr = self._parse_expression_safely(equation)
-            
-            # Define the variable
-            var = sympy.Symbol(variable)
-            
-            # Solve the equation
-            solutions = sympy.solve(expr, var)
+            solutions = self.solve_equation_raw(equation, variable)
             
             return {
                 "status": "success",
@@ -126,7 +405,9 @@ class MathTools:
         """
         try:
             expr = self._parse_expression_safely(expression)
-            simplified = sympy.simplify(expr)
+            
+            # Atoms and linear polynomials are already canonical; skip the costly simplify() pass
+            simplified = expr if _is_trivially_simplified(expr) else _simplify_cached(expr)
             
             return {
                 "status": "success",
@@ -155,11 +436,8 @@ class MathTools:
             Dict containing derivative and metadata
         """
         try:
-            expr = self._parse_expression_safely(expression)
-            var = sympy.Symbol(variable)
-            
-            # Calculate derivative
-            derivative = sympy.diff(expr, var, order)
+            # Calculate derivative (memoized for repeated inputs)
+            derivative = _derivative_cached(expression, variable, order)
             
             return {
                 "status": "success",
@@ -167,7 +445,7 @@ class MathTools:
                 "variable": variable,
                 "order": order,
                 "derivative": str(derivative),
-                "simplified_derivative": str(sympy.simplify(derivative))
+                "simplified_derivative": str(_maybe_simplify(derivative))
             }
             
         except Exception as e:
@@ -192,20 +470,16 @@ class MathTools:
             Dict containing integral and metadata
         """
         try:
-            expr = self._parse_expression_safely(expression)
-            var = sympy.Symbol(variable)
-            
             if limits:
                 # Definite integral
                 if len(limits) != 2:
                     raise ValueError("Limits must be a list of exactly 2 values [lower, upper]")
                 
-                lower, upper = limits
-                integral = sympy.integrate(expr, (var, lower, upper))
+                integral = _integral_cached(expression, variable, tuple(limits))
                 integral_type = "definite"
             else:
                 # Indefinite integral
-                integral = sympy.integrate(expr, var)
+                integral = _integral_cached(expression, variable)
                 integral_type = "indefinite"
             
             return {
@@ -215,7 +489,7 @@ class MathTools:
                 "limits": limits,
                 "integral_type": integral_type,
                 "integral": str(integral),
-                "simplified_integral": str(sympy.simplify(integral))
+                "simplified_integral": str(_maybe_simplify(integral))
             }
             
         except Exception as e:
@@ -268,7 +542,19 @@ class MathTools:
         """
         try:
             # Clean expression - allow numbers, basic operators, and parentheses
-            cleaned_expr = re.sub(r'[^0-9+\-*/().\s]', '', expression.replace('x', '*'))
+            cleaned_expr = _NON_ARITHMETIC_RE.sub('', expression.replace('x', '*'))
+            
+            # Plain numeric arithmetic is evaluated directly, skipping SymPy entirely
+            fast_result = _evaluate_arithmetic_fast(cleaned_expr)
+            if fast_result is not None:
+                return {
+                    "status": "success",
+                    "original_expression": expression,
+                    "cleaned_expression": cleaned_expr,
+                    "result": fast_result,
+                    "result_type": "arithmetic",
+                    "precision": "high"
+                }
             
             # Use SymPy for high-precision arithmetic
             expr = sympy.sympify(cleaned_expr)
@@ -324,14 +610,12 @@ class MathTools:
         """
         try:
             # Step 1: Load routing prompt
-            routing_prompt_file = 'config/math_routing_prompt.txt'
             try:
-                with open(routing_prompt_file, 'r', encoding='utf-8') as f:
-                    routing_system_prompt = f.read().strip()
+                routing_system_prompt = self._load_prompt(MATH_ROUTING_PROMPT_FILE)
             except FileNotFoundError:
                 return {
                     "status": "error",
-                    "message": f"Math routing prompt file not found: {routing_prompt_file}",
+                    "message": f"Math routing prompt file not found: {MATH_ROUTING_PROMPT_FILE}",
                     "query": query
                 }
             
@@ -342,6 +626,7 @@ class MathTools:
                     {"role": "system", "content": routing_system_prompt},
                     {"role": "user", "content": f"Query: {query}"}
                 ],
+                text={"format": MATH_ROUTING_FORMAT},
                 store=False,  # No stateful storage
                 max_output_tokens=100,
                 temperature=0.1
@@ -350,13 +635,14 @@ class MathTools:
             # Step 3: Parse routing decision
             routing_json = routing_response.output_text.strip()
             
-            # Clean JSON response (remove any markdown formatting)
-            if routing_json.startswith('```'):
-                routing_json = routing_json.split('\n')[1:-1]
-                routing_json = '\n'.join(routing_json)
+            # Clean JSON response (remove any markdown formatting) in case a model ignores the schema
+            fence_match = _JSON_FENCE_RE.match(routing_json)
+            if fence_match:
+                routing_json = fence_match.group(1)
             
             try:
-                routing_decision = json.loads(routing_json)
+                # orjson.JSONDecodeError subclasses json.JSONDecodeError
+                routing_decision = orjson.loads(routing_json) if orjson is not None else json.loads(routing_json)
             except json.JSONDecodeError as e:
                 return {
                     "status": "error",
@@ -410,6 +696,7 @@ class MathTools:
                 }
             
             # Step 6: Add routing metadata
+            result["query"] = query
             result["routing_decision"] = {
                 "operation": operation,
                 "context_used": needs_context,
@@ -428,16 +715,14 @@ class MathTools:
     
     def _extract_equation_from_query(self, query: str) -> str:
         """Extract the mathematical equation from a natural language query."""
-        import re
-        
         # Remove common prefixes
-        cleaned = re.sub(r'^(solve|find|what is|calculate)\s+', '', query.lower())
-        cleaned = re.sub(r'^(for|the\s+)?(equation|expression)\s+', '', cleaned)
+        cleaned = _EQUATION_VERB_RE.sub('', query.lower())
+        cleaned = _EQUATION_NOUN_RE.sub('', cleaned)
         # Handle "solve for x = ..." pattern specifically
-        cleaned = re.sub(r'^for\s+', '', cleaned)
+        cleaned = _EQUATION_FOR_RE.sub('', cleaned)
         
         # Look for equation patterns
-        equation_match = re.search(r'([0-9a-zA-Z+\-*/^=().\s]+)', cleaned)
+        equation_match = _EQUATION_RE.search(cleaned)
         if equation_match:
             return equation_match.group(1).strip()
         
@@ -446,18 +731,10 @@ class MathTools:
     
     def _extract_expression_from_query(self, query: str) -> str:
         """Extract the mathematical expression from a natural language query."""
-        import re
-        
         # Remove common prefixes for different operations
-        patterns = [
-            r'^(simplify|derivative of|differentiate|integrate|factor|factorize)\s+',
-            r'^(find the|calculate the|what is the)\s+',
-            r'^(the\s+)?(derivative|integral|factor)\s+of\s+'
-        ]
-        
         cleaned = query.lower()
-        for pattern in patterns:
-            cleaned = re.sub(pattern, '', cleaned)
+        for pattern in _EXPRESSION_PREFIX_RES:
+            cleaned = pattern.sub('', cleaned)
         
         # For integrals, remove limits information
         if 'from' in cleaned and 'to' in cleaned:
@@ -467,7 +744,7 @@ class MathTools:
                 cleaned = expr_before_from
         
         # Look for mathematical expressions
-        expr_match = re.search(r'([0-9a-zA-Z+\-*/^().\s,sin|cos|tan|log|exp|sqrt]+)', cleaned)
+        expr_match = _EXPRESSION_RE.search(cleaned)
         if expr_match:
             return expr_match.group(1).strip()
         
@@ -476,10 +753,8 @@ class MathTools:
     
     def _extract_arithmetic_from_query(self, query: str) -> str:
         """Extract arithmetic expression from query."""
-        import re
-        
         # Look for arithmetic patterns (numbers and basic operators)
-        arithmetic_match = re.search(r'([0-9+\-*/().\s]+)', query)
+        arithmetic_match = _ARITHMETIC_RE.search(query)
         if arithmetic_match:
             return arithmetic_match.group(1).strip()
         
@@ -487,72 +762,43 @@ class MathTools:
     
     def _extract_derivative_params(self, query: str) -> tuple:
         """Extract variable and order from derivative query."""
-        import re
-        
         # Default values
         variable = "x"
         order = 1
+        lowered = query.lower()
         
         # Look for variable specification
-        var_match = re.search(r'with respect to (\w+)', query.lower())
+        var_match = _RESPECT_TO_RE.search(lowered)
         if var_match:
             variable = var_match.group(1)
         
         # Look for order specification
-        order_patterns = [
-            r'(\d+)(?:st|nd|rd|th)?\s+derivative',
-            r'second derivative',
-            r'third derivative'
-        ]
-        
-        for pattern in order_patterns:
-            order_match = re.search(pattern, query.lower())
+        for pattern, pattern_order in _DERIVATIVE_ORDER_RES:
+            order_match = pattern.search(lowered)
             if order_match:
-                if 'second' in pattern:
-                    order = 2
-                elif 'third' in pattern:
-                    order = 3
-                else:
-                    try:
-                        order = int(order_match.group(1))
-                    except (IndexError, ValueError):
-                        pass
+                order = pattern_order if pattern_order is not None else int(order_match.group(1))
                 break
         
         return variable, order
     
     def _extract_integral_params(self, query: str) -> tuple:
         """Extract variable and limits from integral query."""
-        import re
-        
         # Default values
         variable = "x"
         limits = None
+        lowered = query.lower()
         
         # Look for variable specification
-        var_match = re.search(r'with respect to (\w+)', query.lower())
+        var_match = (_RESPECT_TO_RE.search(lowered) or _DIFFERENTIAL_RE.search(query)
+                     or _BARE_VARIABLE_RE.search(query))
         if var_match:
             variable = var_match.group(1)
-        elif re.search(r'd(\w+)', query):
-            var_match = re.search(r'd(\w+)', query)
-            variable = var_match.group(1)
         
         # Look for limits specification
-        limits_patterns = [
-            r'from\s+([^to\s]+)\s+to\s+([^\s,]+)',
-            r'between\s+([^and\s]+)\s+and\s+([^\s,]+)',
-            r'\[([^,]+),\s*([^\]]+)\]'
-        ]
-        
-        for pattern in limits_patterns:
-            limits_match = re.search(pattern, query.lower())
+        for pattern in _INTEGRAL_LIMITS_RES:
+            limits_match = pattern.search(lowered)
             if limits_match:
-                try:
-                    lower = limits_match.group(1).strip()
-                    upper = limits_match.group(2).strip()
-                    limits = [lower, upper]
-                    break
-                except (IndexError, AttributeError):
-                    pass
+                limits = [limits_match.group(1).strip(), limits_match.group(2).strip()]
+                break
         
         return variable, limits 
\ No newline at end of file
@@ -7,32 +7,185 @@ Single responsibility: media file analysis only.
 """
 
 import os
+import json
+import time
 import base64
-from typing import Dict, Any
+import asyncio
+import tempfile
+from io import BytesIO
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, BinaryIO, Iterator, List, Optional
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from .scratchpad_tools import DiskCache, InMemoryCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Pillow is optional; images are sent at their original size without it
+    Image = ImageOps = None
+
+# How many image analyses analyze_media_files keeps in flight at once
+MAX_CONCURRENT_ANALYSES = 8
+
+IMAGE_MIME_TYPES = MappingProxyType({
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp'
+})
+
+# Question keywords and the vision prompt each selects, checked in order
+QUESTION_PROMPTS = (
+    (('count', 'how many', 'number of'),
+     "The user is asking: '{question}'. Please count and provide the exact number of items they're asking about in this image. Be specific and precise with your count."),
+    (('what color', 'color of', 'colors'),
+     "The user is asking: '{question}'. Please focus on describing the colors in this image, being specific about the hues, shades, and color relationships you observe."),
+    (('where', 'location', 'position'),
+     "The user is asking: '{question}'. Please focus on describing the locations and positions of objects in this image."),
+    (('what is', 'what are', 'describe', 'tell me about'),
+     "The user is asking: '{question}'. Please provide a detailed description focusing on what they're specifically asking about in this image.")
+)
+OTHER_QUESTION_PROMPT = "The user is asking: '{question}'. Please analyze this image with a focus on answering their specific question. Provide relevant details that directly address what they want to know."
+GENERAL_ANALYSIS_PROMPT = "Analyze this image in detail. Describe what you see, including objects, people, text, colors, composition, and any other relevant details that would be helpful for someone asking about this image."
+
+# Bytes read per step in _encode_image; a multiple of 3 so each chunk encodes without padding
+ENCODE_CHUNK_SIZE = 3 * 64 * 1024
+
+# The API scales high-detail images to fit 2048x2048 and then to 768px on the
+# shortest side; shrinking to the same bounds first sends fewer bytes for the same tokens
+MAX_IMAGE_SIDE = 2048
+MAX_IMAGE_SHORT_SIDE = 768
+
+# Batch states after which batches.retrieve will not change any more
+BATCH_FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def _file_extension(path: str) -> str:
+    """Return the lower-cased extension of path including the dot, or '' if it has none.
+    
+    A single rpartition instead of os.path.splitext; a dot inside a directory
+    name is not mistaken for an extension.
+    """
+    _, dot, ext = path.rpartition('.')
+    if not dot or '/' in ext or os.sep in ext:
+        return ''
+    return dot + ext.lower()
+
+
+def _mime_type(image_path: str) -> str:
+    """Return the MIME type for an image path, defaulting to PNG."""
+    return IMAGE_MIME_TYPES.get(_file_extension(image_path), 'image/png')
 
 
 class MediaTools:
     """Focused media file analysis functionality."""
     
-    def __init__(self):
-        """Initialize the media tools."""
+    def __init__(self, client: Optional[OpenAI] = None, aclient: Optional[AsyncOpenAI] = None,
+                 cache_dir: Optional[str] = None):
+        """Initialize the media tools.
+        
+        Args:
+            client: OpenAI client to use instead of building one from OPENAI_API_KEY
+            aclient: AsyncOpenAI client to use instead of building one from OPENAI_API_KEY
+            cache_dir: Keep image analyses on disk here, so they are reused across
+                runs, instead of only in memory
+        """
         # Load environment variables
         load_dotenv()
         
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # Initialize OpenAI clients
+        if client is None or aclient is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            if client is None:
+                client = OpenAI(api_key=api_key)
+            if aclient is None:
+                # Async client for aanalyze_media_files
+                aclient = AsyncOpenAI(api_key=api_key)
+        
+        self.client = client
+        self.aclient = aclient
+        
+        # Successful image analyses, keyed on the file version and the question asked
+        self.analysis_cache = DiskCache(cache_dir) if cache_dir else InMemoryCache()
+    
+    def cache_clear(self) -> None:
+        """Forget all cached image analyses."""
+        self.analysis_cache.clear()
+    
+    def _analysis_cache_key(self, image_path: str, user_question: str = None,
+                            stat: Optional[os.stat_result] = None) -> Optional[str]:
+        """Build the analysis cache key, or None if the file cannot be stat'ed.
+        
+        The modification time and size stand in for the file contents, so an
+        edited or replaced image is analyzed again. Pass the caller's stat
+        result to skip a second stat call.
+        """
+        if stat is None:
+            try:
+                stat = os.stat(image_path)
+            except OSError:
+                return None
+        return f"{os.path.abspath(image_path)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{user_question or ''}"
+    
+    def _downscale_image(self, image_file: BinaryIO) -> Optional[bytes]:
+        """Return the image shrunk to the size the API would scale it to, in its own format.
         
-        self.client = OpenAI(api_key=api_key)
+        Reads from the caller's open file so the image is opened only once.
+        The EXIF orientation is applied before resizing, since the re-encoded
+        image no longer carries the tag that would rotate it. Returns None when the image is already small enough, is animated (a
+        resize would keep only the first frame), Pillow is not installed, or
+        Pillow cannot read the file; the caller then sends the file as is.
+        """
+        if Image is None:
+            return None
+        try:
+            with Image.open(image_file) as img:
+                if getattr(img, "is_animated", False):
+                    return None
+                # exif_transpose returns a copy, so no orientation tag is lost
+                # when nothing needs rotating
+                upright = ImageOps.exif_transpose(img)
+                width, height = upright.size
+                scale = min(MAX_IMAGE_SIDE / max(width, height), MAX_IMAGE_SHORT_SIDE / min(width, height))
+                if scale >= 1:
+                    return None
+                image_format = img.format
+                resized = upright.resize((max(1, round(width * scale)), max(1, round(height * scale))),
+                                     Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format=image_format)
+            return buffer.getvalue()
+        except Exception:
+            return None
     
     def _encode_image(self, image_path: str) -> str:
-        """Encode image to base64 for OpenAI API."""
+        """Encode image to base64 for OpenAI API, downscaling large images first."""
         try:
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                downscaled = self._downscale_image(image_file)
+                if downscaled is not None:
+                    return base64.b64encode(downscaled).decode('ascii')
+                
+                # Encode chunk by chunk so the raw file bytes are never held in full,
+                # reading every chunk into one reused buffer and writing into an
+                # output buffer sized up front for the whole encoding
+                image_file.seek(0)
+                size = os.fstat(image_file.fileno()).st_size
+                encoded = bytearray((size + 2) // 3 * 4)
+                chunk = memoryview(bytearray(ENCODE_CHUNK_SIZE))
+                end = 0
+                while read := image_file.readinto(chunk):
+                    piece = base64.b64encode(chunk[:read])
+                    encoded[end:end + len(piece)] = piece
+                    end += len(piece)
+                # The file may have changed size since the fstat
+                del encoded[end:]
+            return encoded.decode('ascii')
         except Exception as e:
             return f"Error encoding image: {e}"
     
@@ -49,8 +202,10 @@ class MediaTools:
             Dict containing media analysis results
         """
         try:
-            # Check if file exists
-            if not os.path.exists(file_path):
+            # One stat both checks that the file exists and keys the analysis cache
+            try:
+                stat = os.stat(file_path)
+            except OSError:
                 return {
                     "status": "error",
                     "message": f"Media file not found: {file_path}",
@@ -59,11 +214,11 @@ class MediaTools:
                 }
             
             # Get file extension to determine type
-            file_ext = os.path.splitext(file_path)[1].lower()
+            file_ext = _file_extension(file_path)
             
-            if file_ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']:
+            if file_ext in IMAGE_MIME_TYPES:
                 # Handle image files
-                return self._analyze_image(file_path, user_question)
+                return self._analyze_image(file_path, user_question, stat)
             elif file_ext == '.pdf':
                 # For now, return basic info for PDFs (can be enhanced later)
                 return {
@@ -89,85 +244,318 @@ class MediaTools:
                 "file_type": "unknown"
             }
     
-    def _analyze_image(self, image_path: str, user_question: str = None) -> Dict[str, Any]:
-        """Analyze an image file using GPT-4o-mini vision capabilities."""
+    def _image_request(self, image_path: str, base64_image: str, user_question: str = None) -> Dict[str, Any]:
+        """Build the chat.completions request that asks GPT-4o-mini about an encoded image."""
+        mime_type = _mime_type(image_path)
+        
+        # Create context-aware prompt based on user question
+        if user_question:
+            lowered = user_question.lower()
+            template = next((prompt for words, prompt in QUESTION_PROMPTS
+                             if any(word in lowered for word in words)), OTHER_QUESTION_PROMPT)
+            analysis_prompt = template.format(question=user_question)
+        else:
+            analysis_prompt = GENERAL_ANALYSIS_PROMPT
+        
+        # Chat Completions API is required for vision
+        return {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": analysis_prompt
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{mime_type};base64,{base64_image}"
+                            }
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.3
+        }
+    
+    def _image_result(self, image_path: str, analysis: str) -> Dict[str, Any]:
+        """Wrap a vision model answer in the analyze_media_file result shape."""
+        return {
+            "status": "success",
+            "file_path": image_path,
+            "file_type": "image",
+            "analysis": analysis,
+            "mime_type": _mime_type(image_path)
+        }
+    
+    def _image_error(self, message: str) -> Dict[str, Any]:
+        """Build the error result for an image that could not be analyzed."""
+        return {
+            "status": "error",
+            "message": message,
+            "analysis": "",
+            "file_type": "image"
+        }
+    
+    def _image_stat(self, file_path: str) -> Optional[os.stat_result]:
+        """Stat file_path if it is an existing image the vision model can analyze, else return None."""
+        if _file_extension(file_path) not in IMAGE_MIME_TYPES:
+            return None
+        try:
+            return os.stat(file_path)
+        except OSError:
+            return None
+    
+    def _analyze_image(self, image_path: str, user_question: str = None,
+                       stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """Analyze an image file using GPT-4o-mini vision capabilities.
+        
+        Repeat questions about an unchanged image are answered from the analysis cache.
+        """
+        cache_key = self._analysis_cache_key(image_path, user_question, stat)
+        cached = self.analysis_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return dict(cached)
         try:
             # Encode image to base64
             base64_image = self._encode_image(image_path)
             
             if base64_image.startswith("Error"):
-                return {
-                    "status": "error",
-                    "message": base64_image,
-                    "analysis": "",
-                    "file_type": "image"
-                }
+                return self._image_error(base64_image)
             
-            # Get file extension for proper MIME type
-            file_ext = os.path.splitext(image_path)[1].lower()
-            mime_type = {
-                '.png': 'image/png',
-                '.jpg': 'image/jpeg',
-                '.jpeg': 'image/jpeg',
-                '.gif': 'image/gif',
-                '.webp': 'image/webp'
-            }.get(file_ext, 'image/png')
-            
-            # Create context-aware prompt based on user question
-            if user_question:
-                # Create a specific prompt based on the user's question
-                if any(word in user_question.lower() for word in ['count', 'how many', 'number of']):
-                    analysis_prompt = f"The user is asking: '{user_question}'. Please count and provide the exact number of items they're asking about in this image. Be specific and precise with your count."
-                elif any(word in user_question.lower() for word in ['what color', 'color of', 'colors']):
-                    analysis_prompt = f"The user is asking: '{user_question}'. Please focus on describing the colors in this image, being specific about the hues, shades, and color relationships you observe."
-                elif any(word in user_question.lower() for word in ['where', 'location', 'position']):
-                    analysis_prompt = f"The user is asking: '{user_question}'. Please focus on describing the locations and positions of objects in this image."
-                elif any(word in user_question.lower() for word in ['what is', 'what are', 'describe', 'tell me about']):
-                    analysis_prompt = f"The user is asking: '{user_question}'. Please provide a detailed description focusing on what they're specifically asking about in this image."
-                else:
-                    analysis_prompt = f"The user is asking: '{user_question}'. Please analyze this image with a focus on answering their specific question. Provide relevant details that directly address what they want to know."
-            else:
-                # Default general analysis prompt
-                analysis_prompt = "Analyze this image in detail. Describe what you see, including objects, people, text, colors, composition, and any other relevant details that would be helpful for someone asking about this image."
-            
-            # Analyze image with GPT-4o-mini using Chat Completions API (required for vision)
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": analysis_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{mime_type};base64,{base64_image}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.3
+            response = self.client.chat.completions.create(**self._image_request(image_path, base64_image, user_question))
+            result = self._image_result(image_path, response.choices[0].message.content)
+            if cache_key:
+                self.analysis_cache.set(cache_key, dict(result))
+            return result
+            
+        except Exception as e:
+            return self._image_error(f"Error analyzing image: {e}")
+    
+    def stream_image_analysis(self, image_path: str, user_question: str = None) -> Iterator[str]:
+        """
+        Analyze an image like analyze_media_file, yielding the answer as it is generated.
+        
+        The first words can be shown while the rest is still being written. The
+        full answer is cached once the stream ends, and a cached answer is
+        yielded in one piece.
+        
+        Args:
+            image_path: Path to the image to analyze
+            user_question: The specific question the user is asking about this image (optional)
+            
+        Yields:
+            Pieces of the analysis text, in order
+            
+        Raises:
+            ValueError: If the file is not an existing image or cannot be encoded
+        """
+        stat = self._image_stat(image_path)
+        if stat is None:
+            raise ValueError(f"Not an image file: {image_path}")
+        
+        cache_key = self._analysis_cache_key(image_path, user_question, stat)
+        cached = self.analysis_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            yield cached["analysis"]
+            return
+        
+        base64_image = self._encode_image(image_path)
+        if base64_image.startswith("Error"):
+            raise ValueError(base64_image)
+        
+        stream = self.client.chat.completions.create(
+            **self._image_request(image_path, base64_image, user_question), stream=True
+        )
+        parts = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        if cache_key:
+            self.analysis_cache.set(cache_key, self._image_result(image_path, "".join(parts)))
+    
+    async def _aanalyze_image(self, image_path: str, user_question: str = None,
+                              stat: Optional[os.stat_result] = None) -> Dict[str, Any]:
+        """Async version of _analyze_image using the AsyncOpenAI client."""
+        cache_key = self._analysis_cache_key(image_path, user_question, stat)
+        cached = self.analysis_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            return dict(cached)
+        try:
+            # Encode off the event loop so other files' requests keep going meanwhile
+            base64_image = await asyncio.to_thread(self._encode_image, image_path)
+            
+            if base64_image.startswith("Error"):
+                return self._image_error(base64_image)
+            
+            response = await self.aclient.chat.completions.create(**self._image_request(image_path, base64_image, user_question))
+            result = self._image_result(image_path, response.choices[0].message.content)
+            if cache_key:
+                self.analysis_cache.set(cache_key, dict(result))
+            return result
+            
+        except Exception as e:
+            return self._image_error(f"Error analyzing image: {e}")
+    
+    def analyze_media_files(self, file_paths: List[str], user_question: str = None) -> List[Dict[str, Any]]:
+        """
+        Analyze several media files concurrently.
+        
+        Up to MAX_CONCURRENT_ANALYSES files are encoded and sent at once on the
+        sync client, so the network round trips overlap instead of adding up.
+        
+        Args:
+            file_paths: Paths to the media files to analyze
+            user_question: The question the user is asking about these files (optional)
+            
+        Returns:
+            One analyze_media_file result per path, in the same order
+        """
+        if not file_paths:
+            return []
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_ANALYSES, len(file_paths))) as executor:
+            return list(executor.map(lambda path: self.analyze_media_file(path, user_question), file_paths))
+    
+    async def aanalyze_media_files(self, file_paths: List[str], user_question: str = None) -> List[Dict[str, Any]]:
+        """
+        Async version of analyze_media_files using the AsyncOpenAI client.
+        
+        Args:
+            file_paths: Paths to the media files to analyze
+            user_question: The question the user is asking about these files (optional)
+            
+        Returns:
+            One analyze_media_file result per path, in the same order
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+        
+        async def analyze(path: str) -> Dict[str, Any]:
+            stat = self._image_stat(path)
+            if stat is None:
+                # Missing files, PDFs and unsupported types are answered locally
+                return self.analyze_media_file(path, user_question)
+            async with semaphore:
+                return await self._aanalyze_image(path, user_question, stat)
+        
+        return list(await asyncio.gather(*(analyze(path) for path in file_paths)))
+    
+    def submit_batch(self, file_paths: List[str], user_question: str = None) -> Dict[str, Any]:
+        """
+        Submit image analyses to the OpenAI Batch API for non-interactive bulk runs.
+        
+        Batch requests are billed at half price but may take up to 24 hours;
+        collect the answers with wait_for_batch.
+        
+        Args:
+            file_paths: Paths to the media files to analyze
+            user_question: The question the user is asking about these files (optional)
+            
+        Returns:
+            Dict with the batch id, the custom_id of each submitted file and the
+            local results for files that could not be submitted
+        """
+        requests = {}
+        skipped = {}
+        lines = []
+        for index, path in enumerate(file_paths):
+            if self._image_stat(path) is None:
+                skipped[path] = self.analyze_media_file(path, user_question)
+                continue
+            base64_image = self._encode_image(path)
+            if base64_image.startswith("Error"):
+                skipped[path] = self._image_error(base64_image)
+                continue
+            custom_id = f"media-{index}"
+            requests[custom_id] = path
+            lines.append(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._image_request(path, base64_image, user_question)
+            }))
+        
+        if not lines:
+            return {"status": "error", "message": "No image files to submit", "requests": requests, "skipped": skipped}
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                batch_file = os.path.join(tmp_dir, "media_batch.jsonl")
+                with open(batch_file, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(lines) + "\n")
+                with open(batch_file, 'rb') as f:
+                    uploaded = self.client.files.create(file=f, purpose="batch")
+            
+            batch = self.client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
             )
+        except Exception as e:
+            return {"status": "error", "message": f"Error submitting batch: {e}", "requests": requests, "skipped": skipped}
+        
+        return {"status": "success", "batch_id": batch.id, "requests": requests, "skipped": skipped}
+    
+    def wait_for_batch(self, batch_id: str, requests: Dict[str, str], poll_interval: float = 30.0,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Poll a batch from submit_batch until it finishes and collect its analyses.
+        
+        Args:
+            batch_id: Id returned by submit_batch
+            requests: The custom_id to file path mapping returned by submit_batch
+            poll_interval: Seconds to sleep between batches.retrieve calls
+            timeout: Give up after this many seconds (None waits for the 24h window)
             
-            analysis = response.choices[0].message.content
+        Returns:
+            Dict with the batch status and one analyze_media_file result per file path
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            batch = self.client.batches.retrieve(batch_id)
+            while batch.status not in BATCH_FINAL_STATES:
+                if deadline is not None and time.monotonic() >= deadline:
+                    return {"status": "error", "message": f"Batch {batch_id} still {batch.status} after {timeout}s", "results": {}}
+                time.sleep(poll_interval)
+                batch = self.client.batches.retrieve(batch_id)
             
-            return {
-                "status": "success",
-                "file_path": image_path,
-                "file_type": "image",
-                "analysis": analysis,
-                "mime_type": mime_type
-            }
+            if batch.status != 'completed' or not batch.output_file_id:
+                return {"status": "error", "message": f"Batch {batch_id} ended as {batch.status}", "results": {}}
             
+            output = self.client.files.content(batch.output_file_id).text
         except Exception as e:
-            return {
-                "status": "error",
-                "message": f"Error analyzing image: {e}",
-                "analysis": "",
-                "file_type": "image"
-            } 
\ No newline at end of file
+            return {"status": "error", "message": f"Error waiting for batch: {e}", "results": {}}
+        
+        results = {path: self._image_error("No result returned by the batch") for path in requests.values()}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            # A malformed line names no file, so its path keeps the "no result" error above
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            path = requests.get(record.get("custom_id"))
+            if path is None:
+                continue
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                results[path] = self._image_error(f"Error analyzing image: {record.get('error') or response.get('body')}")
+                continue
+            try:
+                analysis = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError) as e:
+                results[path] = self._image_error(f"Unexpected batch response for {path}: {e!r}")
+                continue
+            results[path] = self._image_result(path, analysis)
+        
+        return {"status": "success", "results": results}
@@ -7,149 +7,685 @@ Single responsibility: context extraction and analysis only.
 """
 
 import os
+import re
+import copy
 import json
-from typing import Dict, Any
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from .text_utils import decode_json_at, read_text
+
+
+class InMemoryCache:
+    """Minimal exact-match cache with a per-entry time-to-live and a size bound.
+    
+    Safe to share between threads; once full, the least recently used entry
+    is dropped to make room.
+    """
+    
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 256):
+        """Initialize an empty cache.
+        
+        Args:
+            ttl_seconds: How long an entry stays valid after it is stored
+            max_entries: Entries kept at most; the least recently used go first
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expiry_ts = entry
+            if time.monotonic() >= expiry_ts:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key until the TTL elapses."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    """Exact-match cache like InMemoryCache, persisted as one JSON file per entry.
+    
+    Entries survive restarts, so repeated requests across runs skip the API.
+    Values must be JSON-serializable.
+    """
+    
+    def __init__(self, directory: str, ttl_seconds: float = 7 * 24 * 3600.0):
+        """Initialize the cache, creating its directory if needed.
+        
+        Args:
+            directory: Directory holding the cache files
+            ttl_seconds: How long an entry stays valid after it is stored
+        """
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key: str) -> str:
+        """Return the file holding key; keys are hashed so any string is a safe file name."""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+    
+    @staticmethod
+    def _discard(path: str) -> None:
+        """Remove a cache file, ignoring one that is already gone."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if missing, expired or unreadable."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            entry = None
+        # A corrupt or foreign file would fail every later run too; drop it as a miss
+        if not isinstance(entry, dict) or not isinstance(entry.get("expires"), (int, float)):
+            self._discard(path)
+            return None
+        # Wall-clock time, since the expiry has to mean the same thing in the next process
+        if time.time() >= entry["expires"]:
+            self._discard(path)
+            return None
+        return entry.get("value")
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key until the TTL elapses."""
+        path = self._path(key)
+        # Write to a temporary file and swap it in with os.replace, so concurrent
+        # readers see either the old entry or the new one, never a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"expires": time.time() + self.ttl_seconds, "value": value}, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            # A full or read-only disk, or a value JSON cannot hold, only costs the cache entry
+            self._discard(temp_path)
+    
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                self._discard(os.path.join(self.directory, name))
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over unit-length query embeddings.
+    
+    Entries are grouped by scope so that answers are only reused for requests
+    that sent the same context. Each scope keeps its embeddings as the rows of
+    one matrix, so a lookup is a single matrix-vector product. Safe to share
+    between threads, like InMemoryCache.
+    """
+    
+    def __init__(self, threshold: float = 0.95, max_entries: int = 256):
+        """Initialize an empty cache.
+        
+        Args:
+            threshold: Minimum cosine similarity for a cached answer to be reused
+            max_entries: Entries kept per scope; the oldest are dropped first
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embeddings: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, scope: str, vector: np.ndarray) -> Optional[Any]:
+        """Return the value of the most similar entry in scope, or None below the threshold."""
+        with self._lock:
+            embeddings = self._embeddings.get(scope)
+            if embeddings is None:
+                return None
+            similarities = embeddings @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return self._values[scope][best]
+    
+    def set(self, scope: str, vector: np.ndarray, value: Any) -> None:
+        """Store value under the embedding vector in scope."""
+        with self._lock:
+            embeddings = self._embeddings.get(scope)
+            if embeddings is None:
+                embeddings = np.empty((0, vector.shape[0]), dtype=np.float32)
+                self._values[scope] = []
+            self._embeddings[scope] = np.vstack([embeddings, vector])[-self.max_entries:]
+            self._values[scope] = (self._values[scope] + [value])[-self.max_entries:]
+    
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._embeddings.clear()
+            self._values.clear()
+
+
+def _unit_vector(embedding: List[float]) -> np.ndarray:
+    """Convert an embedding to a float32 vector of length one."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _response_cache_key(query: str, scratchpad_content: str, system_prompt: str) -> str:
+    """Build the cache key for a context request.
+    
+    Case and whitespace in the query are normalized; the scratchpad and system
+    prompt are hashed so that editing either file invalidates earlier answers.
+    """
+    normalized_query = " ".join(query.casefold().split())
+    scratchpad_digest = hashlib.blake2b(scratchpad_content.encode('utf-8'), digest_size=16).hexdigest()
+    prompt_digest = hashlib.blake2b(system_prompt.encode('utf-8'), digest_size=16).hexdigest()
+    key_material = f"{normalized_query}|{scratchpad_digest}|{prompt_digest}".encode('utf-8')
+    return hashlib.blake2b(key_material, digest_size=16).hexdigest()
+
+
+# Trailing spaces and runs of blank lines cost input tokens without telling the model anything
+_TRAILING_SPACE_RE = re.compile(r'[ \t]+$', re.MULTILINE)
+_BLANK_RUN_RE = re.compile(r'\n{3,}')
+
+
+@functools.lru_cache(maxsize=2)
+def _compact_scratchpad(content: str) -> str:
+    """Strip trailing spaces and collapse runs of blank lines to a single blank line.
+    
+    Appended updates leave the scratchpad padded with blank lines. Memoized on
+    the content, like _split_sections, so it runs once per file version.
+    """
+    return _BLANK_RUN_RE.sub('\n\n', _TRAILING_SPACE_RE.sub('', content))
+
+
+# Markdown heading lines split the scratchpad into prunable sections
+_HEADING_RE = re.compile(r'^#{1,6}\s', re.MULTILINE)
+_WORD_RE = re.compile(r'\w+')
+
+# Query words too common to tell sections apart
+_STOPWORDS = frozenset({
+    "about", "does", "from", "have", "know", "show", "tell", "that", "them",
+    "they", "this", "what", "when", "where", "which", "with", "your"
+})
+
+
+@functools.lru_cache(maxsize=2)
+def _split_sections(content: str) -> Tuple[Tuple[str, str, FrozenSet[str]], ...]:
+    """Split scratchpad content into (heading line, section text, lowercased words) triples.
+    
+    Text before the first heading becomes a section with an empty heading.
+    Memoized on the content, which read_text hands back as the same object
+    until the file changes.
+    """
+    starts = [match.start() for match in _HEADING_RE.finditer(content)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = []
+    for start, end in zip(starts, starts[1:] + [len(content)]):
+        text = content[start:end].rstrip('\n')
+        heading = text.partition('\n')[0] if _HEADING_RE.match(text) else ""
+        sections.append((heading, text, frozenset(_WORD_RE.findall(text.lower()))))
+    return tuple(sections)
+
+
+def _query_terms(query: str) -> List[str]:
+    """Return the lowercased query words worth matching against sections."""
+    return [word for word in _WORD_RE.findall(query.lower())
+            if len(word) >= 4 and word not in _STOPWORDS]
+
+
+def _prune_scratchpad(content: str, query: str) -> str:
+    """Keep the scratchpad sections that mention the query and outline the rest.
+    
+    Every heading is kept so the model still sees the shape of the document,
+    but sections that share no whole word with the query, stop words aside,
+    are sent as their heading only. Content with a single section, or where
+    no section matches, is returned unchanged. A section that answers a
+    paraphrase without repeating its words is dropped, which is why callers
+    have to ask for pruning.
+    """
+    sections = _split_sections(content)
+    terms = _query_terms(query)
+    if len(sections) < 2 or not terms:
+        return content
+    
+    matched = [not words.isdisjoint(terms) for _, _, words in sections]
+    if not any(matched):
+        return content
+    
+    parts = []
+    for (heading, text, _), keep in zip(sections, matched):
+        if keep or text == heading:
+            parts.append(text)
+        elif heading:
+            parts.append(f"{heading}\n[section omitted]")
+    return "\n\n".join(parts)
+
+
+# Model used to embed queries for the semantic cache
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Queries sent per request by get_scratch_pad_context_batch
+BATCH_SIZE = 20
+
+# Output token budget per query; batch requests scale it by the number of queries
+MAX_OUTPUT_TOKENS_PER_QUERY = 800
+
+_RESPONSE_SCHEMA = """{
+    "relevant_context": "extracted relevant information OR for math queries: 'Mathematical calculation required - specific tools needed for: [description]'",
+    "media_files_needed": true/false,
+    "recommended_media": ["list", "of", "file", "paths"],
+    "reasoning": "why these media files would be helpful (or why not needed)"
+}"""
+
+
+def _raw_response_analysis(response_content: str) -> Dict[str, Any]:
+    """Wrap an unparseable model reply so it can still be returned as context."""
+    return {
+        "relevant_context": response_content,
+        "media_files_needed": False,
+        "recommended_media": [],
+        "reasoning": "JSON parsing failed, using raw response"
+    }
+
+
+def _parse_batch_analyses(response_content: str, expected: int) -> Optional[List[Dict[str, Any]]]:
+    """Extract an array of exactly ``expected`` objects from a model reply.
+    
+    JSON mode replies carry the array under a "results" key; a bare JSON
+    array is accepted as well.
+    
+    Returns:
+        List of analysis dicts, or None if the reply does not hold such an array
+    """
+    object_idx = response_content.find('{')
+    array_idx = response_content.find('[')
+    if object_idx != -1 and (array_idx == -1 or object_idx < array_idx):
+        reply = decode_json_at(response_content, '{')
+        analyses = reply.get("results") if isinstance(reply, dict) else None
+    else:
+        analyses = decode_json_at(response_content, '[')
+    if not isinstance(analyses, list) or len(analyses) != expected:
+        return None
+    if not all(isinstance(analysis, dict) for analysis in analyses):
+        return None
+    return analyses
+
+
+def _context_result(query: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the success result for one query from a parsed analysis."""
+    return {
+        "status": "success",
+        "query": query,
+        "relevant_context": analysis.get("relevant_context", ""),
+        "media_files_needed": analysis.get("media_files_needed", False),
+        "recommended_media": analysis.get("recommended_media", []),
+        "reasoning": analysis.get("reasoning", "")
+    }
+
+
+def _responses_request(system_prompt: str, scratchpad_content: str, user_message: str,
+                       max_output_tokens: int) -> Dict[str, Any]:
+    """Build the keyword arguments for a context extraction responses.create call.
+    
+    The query goes last. A full context request shares the whole scratchpad
+    as a stable prefix; a pruned one differs per query, so those calls only
+    share the system prompt.
+    JSON mode makes the reply a single JSON object, so it parses on the first try.
+    """
+    return {
+        "model": "gpt-4o-mini",
+        "input": [
+            {"role": "system", "content": f"{system_prompt}\n\nSCRATCH PAD CONTENT:\n{scratchpad_content}"},
+            {"role": "user", "content": user_message}
+        ],
+        "text": {"format": {"type": "json_object"}},
+        "store": False,  # No stateful storage
+        "max_output_tokens": max_output_tokens,
+        "temperature": 0.1
+    }
+
+
+def _context_error(message: str) -> Dict[str, Any]:
+    """Build the error result returned when context extraction fails."""
+    return {
+        "status": "error",
+        "message": message,
+        "relevant_context": "",
+        "media_files_needed": False,
+        "recommended_media": []
+    }
 
 
 class ScratchPadTools:
     """Focused scratch pad context extraction functionality."""
     
-    def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None):
+    def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None,
+                 semantic_cache: bool = False, client: Optional[OpenAI] = None,
+                 aclient: Optional[AsyncOpenAI] = None, cache_dir: Optional[str] = None):
         """Initialize the scratch pad tools.
         
         Args:
             scratchpad_file: Path to scratch pad file
             system_prompt_file: Path to system prompt file
+            semantic_cache: Also reuse answers to paraphrased queries, matched by
+                embedding similarity, when the exact-match cache misses
+            client: OpenAI client to use instead of building one from OPENAI_API_KEY
+            aclient: AsyncOpenAI client to use instead of building one from OPENAI_API_KEY
+            cache_dir: Keep context extraction results on disk here, so they are
+                reused across runs, instead of only in memory
         """
         # Load environment variables
         load_dotenv()
         
-        # Initialize OpenAI client
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        # Initialize OpenAI clients
+        if client is None or aclient is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            if client is None:
+                client = OpenAI(api_key=api_key)
+            if aclient is None:
+                # Async client for aget_scratch_pad_context; it keeps its own pooled connections
+                aclient = AsyncOpenAI(api_key=api_key)
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = client
+        self.aclient = aclient
         
         # Set file paths
         self.scratchpad_file = scratchpad_file or os.getenv('SCRATCHPAD_FILE', 'scratchpad.txt')
         self.system_prompt_file = system_prompt_file or os.getenv('SYSTEM_PROMPT_FILE', 'config/system_prompt.txt')
+        
+        # Successful context extractions, keyed by query and file contents
+        self.response_cache = DiskCache(cache_dir) if cache_dir else InMemoryCache()
+        self.semantic_cache = SemanticCache() if semantic_cache else None
+    
+    def cache_clear(self) -> None:
+        """Forget all cached context extraction results."""
+        self.response_cache.clear()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
     
     def _load_scratchpad(self) -> str:
         """Load the scratch pad content from file."""
-        try:
-            with open(self.scratchpad_file, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        except FileNotFoundError:
+        content = read_text(self.scratchpad_file)
+        if content is None:
             return f"Error: Scratch pad file not found: {self.scratchpad_file}"
+        return content
     
     def _load_system_prompt(self) -> str:
         """Load the system prompt content from file."""
-        try:
-            with open(self.system_prompt_file, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        except FileNotFoundError:
+        content = read_text(self.system_prompt_file)
+        if content is None:
             return "You are a context extraction specialist. Return valid JSON only."
+        return content
     
-    def get_scratch_pad_context(self, query: str) -> Dict[str, Any]:
+    def get_scratch_pad_context(self, query: str, no_cache: bool = False,
+                                full_context: bool = True) -> Dict[str, Any]:
         """
         Get relevant context from the scratch pad for a given query.
         This function is marked as REQUIRED and will always be called by GPT-4.1.
         
+        Identical queries against unchanged scratchpad and system prompt files
+        are answered from an in-memory cache instead of calling the API again.
+        With semantic_cache enabled, paraphrases of an earlier query are
+        answered from the cache as well. With full_context set to False,
+        scratchpad sections that share no word with the query are sent as
+        their heading only.
+        
         Args:
             query: The user's question or topic
+            no_cache: Skip the response cache and always call the API
+            full_context: Send the whole scratchpad; False prunes unrelated sections
             
         Returns:
             Dict containing relevant context and media recommendations
         """
         try:
-            # Load scratch pad content
-            scratchpad_content = self._load_scratchpad()
+            result, cache_key, scope, request = self._prepare_context_request(query, no_cache, full_context)
+            if result is not None:
+                return result
             
-            if scratchpad_content.startswith("Error:"):
-                return {
-                    "status": "error",
-                    "message": scratchpad_content,
-                    "relevant_context": "",
-                    "media_files_needed": False,
-                    "recommended_media": []
-                }
-            
-            # Load the system prompt with sophisticated media assessment rules
-            system_prompt = self._load_system_prompt()
+            semantic_entry = None
+            if self.semantic_cache is not None and not no_cache:
+                try:
+                    embedding = self.client.embeddings.create(model=EMBEDDING_MODEL, input=query)
+                except Exception:
+                    # The semantic cache is optional; without an embedding, just ask the model
+                    embedding = None
+                if embedding is not None:
+                    result, semantic_entry = self._semantic_lookup(query, scope, embedding)
+                    if result is not None:
+                        return result
             
-            # Create user message with query and scratch pad content
-            user_message = f"""USER QUERY: {query}
-
-SCRATCH PAD CONTENT:
-{scratchpad_content}
+            response = self.client.responses.create(**request)
+            
+            return self._finish_context_request(query, cache_key, response.output_text, semantic_entry)
+            
+        except Exception as e:
+            return _context_error(f"Error processing scratch pad context: {e}")
+    
+    async def aget_scratch_pad_context(self, query: str, no_cache: bool = False,
+                                       full_context: bool = True) -> Dict[str, Any]:
+        """
+        Async version of get_scratch_pad_context using the AsyncOpenAI client.
+        
+        Args:
+            query: The user's question or topic
+            no_cache: Skip the response cache and always call the API
+            full_context: Send the whole scratchpad; False prunes unrelated sections
+            
+        Returns:
+            Dict containing relevant context and media recommendations
+        """
+        try:
+            result, cache_key, scope, request = self._prepare_context_request(query, no_cache, full_context)
+            if result is not None:
+                return result
+            
+            semantic_entry = None
+            if self.semantic_cache is not None and not no_cache:
+                try:
+                    embedding = await self.aclient.embeddings.create(model=EMBEDDING_MODEL, input=query)
+                except Exception:
+                    # The semantic cache is optional; without an embedding, just ask the model
+                    embedding = None
+                if embedding is not None:
+                    result, semantic_entry = self._semantic_lookup(query, scope, embedding)
+                    if result is not None:
+                        return result
+            
+            response = await self.aclient.responses.create(**request)
+            
+            return self._finish_context_request(query, cache_key, response.output_text, semantic_entry)
+            
+        except Exception as e:
+            return _context_error(f"Error processing scratch pad context: {e}")
+    
+    def _prepare_context_request(self, query: str, no_cache: bool, full_context: bool
+                                 ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[str], Dict[str, Any]]:
+        """Load the files and build the API request for a single query.
+        
+        Returns:
+            Tuple of (result, cache key, semantic cache scope, request kwargs).
+            The result is set when the query can be answered without calling
+            the API: a missing scratchpad or a cache hit.
+        """
+        # Load scratch pad content
+        scratchpad_content = self._load_scratchpad()
+        
+        if scratchpad_content.startswith("Error:"):
+            return _context_error(scratchpad_content), None, None, {}
+        scratchpad_content = _compact_scratchpad(scratchpad_content)
+        
+        # Load the system prompt with sophisticated media assessment rules
+        system_prompt = self._load_system_prompt()
+        
+        # Paraphrases may prune differently, so the semantic scope uses the whole files
+        scope = _response_cache_key(f"full_context={full_context}", scratchpad_content, system_prompt)
+        
+        if not full_context:
+            scratchpad_content = _prune_scratchpad(scratchpad_content, query)
+        
+        # Keyed on the content actually sent, so pruned and full answers stay apart
+        cache_key = _response_cache_key(query, scratchpad_content, system_prompt)
+        if not no_cache:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                result = copy.deepcopy(cached)
+                result["query"] = query
+                return result, cache_key, scope, {}
+        
+        # The query goes in the user message; the scratch pad is part of the system message
+        user_message = f"""USER QUERY: {query}
 
 Please follow the system prompt rules to determine if media files are needed and provide your response in JSON format:
 
 IMPORTANT: For mathematical queries, use exactly: "Mathematical calculation required - specific tools needed for: [brief description]"
 
-{{
-    "relevant_context": "extracted relevant information OR for math queries: 'Mathematical calculation required - specific tools needed for: [description]'",
-    "media_files_needed": true/false,
-    "recommended_media": ["list", "of", "file", "paths"],
-    "reasoning": "why these media files would be helpful (or why not needed)"
-}}"""
-            
-            response = self.client.responses.create(
-                model="gpt-4o-mini",
-                input=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                store=False,  # No stateful storage
-                max_output_tokens=800,
-                temperature=0.1
-            )
+{_RESPONSE_SCHEMA}"""
+        
+        return None, cache_key, scope, _responses_request(
+            system_prompt, scratchpad_content, user_message, MAX_OUTPUT_TOKENS_PER_QUERY
+        )
+    
+    def _semantic_lookup(self, query: str, scope: str,
+                         embedding: Any) -> Tuple[Optional[Dict[str, Any]], Tuple[str, np.ndarray]]:
+        """Look up a cached answer to a paraphrase of query within scope.
+        
+        Returns:
+            Tuple of (cached result or None, (scope, vector) to store the new answer under)
+        """
+        vector = _unit_vector(embedding.data[0].embedding)
+        cached = self.semantic_cache.get(scope, vector)
+        if cached is None:
+            return None, (scope, vector)
+        result = copy.deepcopy(cached)
+        result["query"] = query
+        return result, (scope, vector)
+    
+    def _finish_context_request(self, query: str, cache_key: str, output_text: str,
+                                semantic_entry: Optional[Tuple[str, np.ndarray]] = None) -> Dict[str, Any]:
+        """Turn the model reply into a result and remember it in the response caches."""
+        # The JSON might be wrapped in markdown
+        analysis = decode_json_at(output_text, '{')
+        if analysis is None:
+            # The raw-reply fallback is returned but not cached, so the next call asks the model again
+            return _context_result(query, _raw_response_analysis(output_text))
+        result = _context_result(query, analysis)
+        self.response_cache.set(cache_key, copy.deepcopy(result))
+        if semantic_entry is not None:
+            self.semantic_cache.set(*semantic_entry, copy.deepcopy(result))
+        return result
+    
+    def get_scratch_pad_context_batch(self, queries: List[str], no_cache: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get relevant context from the scratch pad for several queries at once.
+        
+        Uncached queries are sent BATCH_SIZE at a time, each request carrying the
+        scratchpad once and asking for a JSON array with one answer per query.
+        If a reply cannot be split into one answer per query, the queries of
+        that request are retried one by one with get_scratch_pad_context.
+        
+        Args:
+            queries: The user's questions or topics
+            no_cache: Skip the response cache and always call the API
             
-            # Parse the response
-            response_content = response.output_text
-            
-            # Try to extract JSON from the response
-            try:
-                # Find JSON in the response (might be wrapped in markdown)
-                start_idx = response_content.find('{')
-                end_idx = response_content.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_str = response_content[start_idx:end_idx]
-                    analysis = json.loads(json_str)
+        Returns:
+            List of result dicts in the same order as queries, each shaped like
+            the return value of get_scratch_pad_context
+        """
+        try:
+            scratchpad_content = self._load_scratchpad()
+            
+            if scratchpad_content.startswith("Error:"):
+                return [_context_error(scratchpad_content) for _ in queries]
+            scratchpad_content = _compact_scratchpad(scratchpad_content)
+            
+            system_prompt = self._load_system_prompt()
+            
+            results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            cache_keys = [_response_cache_key(query, scratchpad_content, system_prompt) for query in queries]
+            pending = []
+            for index, query in enumerate(queries):
+                cached = None if no_cache else self.response_cache.get(cache_keys[index])
+                if cached is not None:
+                    results[index] = copy.deepcopy(cached)
+                    results[index]["query"] = query
                 else:
-                    # Fallback if no JSON found
-                    analysis = {
-                        "relevant_context": response_content,
-                        "media_files_needed": False,
-                        "recommended_media": [],
-                        "reasoning": "JSON parsing failed, using raw response"
-                    }
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                analysis = {
-                    "relevant_context": response_content,
-                    "media_files_needed": False,
-                    "recommended_media": [],
-                    "reasoning": "JSON parsing failed, using raw response"
-                }
-            
-            return {
-                "status": "success",
-                "query": query,
-                "relevant_context": analysis.get("relevant_context", ""),
-                "media_files_needed": analysis.get("media_files_needed", False),
-                "recommended_media": analysis.get("recommended_media", []),
-                "reasoning": analysis.get("reasoning", "")
-            }
+                    pending.append(index)
+            
+            for start in range(0, len(pending), BATCH_SIZE):
+                chunk = pending[start:start + BATCH_SIZE]
+                analyses = self._request_batch_analyses(
+                    [queries[index] for index in chunk], scratchpad_content, system_prompt
+                )
+                
+                if analyses is None:
+                    # Retry with the same full scratchpad the batch request was sent
+                    for index in chunk:
+                        results[index] = self.get_scratch_pad_context(queries[index], no_cache=True,
+                                                                      full_context=True)
+                    continue
+                
+                for index, analysis in zip(chunk, analyses):
+                    results[index] = _context_result(queries[index], analysis)
+                    self.response_cache.set(cache_keys[index], copy.deepcopy(results[index]))
             
+            return results
+        
         except Exception as e:
-            return {
-                "status": "error",
-                "message": f"Error processing scratch pad context: {e}",
-                "relevant_context": "",
-                "media_files_needed": False,
-                "recommended_media": []
-            } 
\ No newline at end of file
+            return [_context_error(f"Error processing scratch pad context: {e}") for _ in queries]
+    
+    def _request_batch_analyses(self, queries: List[str], scratchpad_content: str,
+                                system_prompt: str) -> Optional[List[Dict[str, Any]]]:
+        """Ask for the analyses of several queries in a single request.
+        
+        Returns:
+            One analysis dict per query, or None if the reply could not be parsed
+        """
+        numbered_queries = "\n".join(f"{number}. {query}" for number, query in enumerate(queries, 1))
+        user_message = f"""USER QUERIES:
+{numbered_queries}
+
+Please follow the system prompt rules for each query independently to determine if media files are needed. Respond with a JSON object whose "results" key holds an array of exactly {len(queries)} objects, one per query and in the same order, each in this format:
+
+IMPORTANT: For mathematical queries, use exactly: "Mathematical calculation required - specific tools needed for: [brief description]"
+
+{_RESPONSE_SCHEMA}"""
+        
+        response = self.client.responses.create(
+            **_responses_request(
+                system_prompt, scratchpad_content, user_message, MAX_OUTPUT_TOKENS_PER_QUERY * len(queries)
+            )
+        )
+        
+        return _parse_batch_analyses(response.output_text, len(queries))
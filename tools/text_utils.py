@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Text helpers shared by the Luzia tools and the update manager: decoding JSON
+from model replies and reading text files through a small version-keyed cache.
+
+Kept free of the OpenAI, SymPy and NumPy imports the tool modules need, so
+any module can use them without pulling in the others.
+"""
+
+import os
+import json
+import functools
+from typing import Any, Optional
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; replies are decoded with the stdlib json module without it
+    orjson = None
+
+
+# Shared decoder for pulling the JSON answer out of model replies
+_JSON_DECODER = json.JSONDecoder()
+
+
+def decode_json_at(text: str, start_char: str) -> Any:
+    """Decode the JSON value that starts at the first ``start_char`` in text.
+    
+    The value is decoded in place, so the reply is not sliced into a copy and
+    any prose or markdown fence after the value is ignored. Replies that are
+    nothing but JSON go through orjson when it is installed.
+    
+    Returns:
+        The decoded value, or None if there is no such character or the JSON is invalid
+    """
+    start_idx = text.find(start_char)
+    if start_idx == -1:
+        return None
+    if orjson is not None and not text[:start_idx].strip():
+        # Bare JSON replies are the common case; decode them whole with orjson
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    try:
+        value, _ = _JSON_DECODER.raw_decode(text, start_idx)
+    except json.JSONDecodeError:
+        return None
+    return value
+
+
+# Entries are keyed on the file version, so every edit adds one. Keep the cache
+# small so that superseded copies of a large scratchpad are dropped quickly.
+@functools.lru_cache(maxsize=4)
+def _read_text_cached(path: str, mtime_ns: int, size: int) -> Optional[str]:
+    """Read and strip a UTF-8 text file, memoized on (path, mtime_ns, size).
+    
+    A file that disappears between the stat and the open is memoized as None,
+    since lru_cache does not cache exceptions.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def read_text(path: str) -> Optional[str]:
+    """Return the stripped contents of a text file, or None if it does not exist.
+    
+    The file is only re-read when its modification time or size changes.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return _read_text_cached(path, stat.st_mtime_ns, stat.st_size)
@@ -6,28 +6,59 @@ Coordinates all specialized tool classes and provides a unified interface.
 Acts as the main entry point for all tool operations.
 """
 
-from typing import Dict, Any
+import os
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+from openai import OpenAI, AsyncOpenAI
 from .math_tools import MathTools
 from .scratchpad_tools import ScratchPadTools
 from .media_tools import MediaTools
 from .image_tools import ImageTools
 
+# Retries for rate limits, timeouts, connection errors and 5xx responses. The
+# SDK backs off exponentially with jitter and honours Retry-After; its default is 2.
+OPENAI_MAX_RETRIES = 5
+
 
 class ToolManager:
     """Coordinates all tools - single entry point for tool operations."""
     
-    def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None):
+    def __init__(self, scratchpad_file: str = None, system_prompt_file: str = None,
+                 semantic_cache: bool = False, client: Optional[OpenAI] = None,
+                 aclient: Optional[AsyncOpenAI] = None, cache_dir: Optional[str] = None):
         """Initialize all tool components.
         
         Args:
             scratchpad_file: Path to scratch pad file
             system_prompt_file: Path to system prompt file
+            semantic_cache: Enable the semantic cache for scratch pad context queries
+            client: OpenAI client to share between the tools instead of building one
+            aclient: AsyncOpenAI client for async scratch pad context and media queries
+            cache_dir: Directory for persistent context and media analysis caches;
+                defaults to LLM_CACHE_DIR, and results stay in memory when neither is set
         """
+        # Build one client pair for all tools, so they share a connection pool
+        # instead of each opening its own connections to the API
+        if client is None or aclient is None:
+            load_dotenv()
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not found in environment variables")
+            if client is None:
+                client = OpenAI(api_key=api_key, max_retries=OPENAI_MAX_RETRIES)
+            if aclient is None:
+                aclient = AsyncOpenAI(api_key=api_key, max_retries=OPENAI_MAX_RETRIES)
+        
+        cache_dir = cache_dir or os.getenv('LLM_CACHE_DIR')
+        
         # Initialize all specialized tools
-        self.math_tools = MathTools()
-        self.scratchpad_tools = ScratchPadTools(scratchpad_file, system_prompt_file)
-        self.media_tools = MediaTools()
-        self.image_tools = ImageTools()
+        self.math_tools = MathTools(client=client)
+        self.scratchpad_tools = ScratchPadTools(scratchpad_file, system_prompt_file, semantic_cache=semantic_cache,
+                                                client=client, aclient=aclient,
+                                                cache_dir=cache_dir and os.path.join(cache_dir, 'context'))
+        self.media_tools = MediaTools(client=client, aclient=aclient,
+                                      cache_dir=cache_dir and os.path.join(cache_dir, 'media'))
+        self.image_tools = ImageTools(client=client)
     
     def execute_function(self, function_name: str, **kwargs) -> Dict[str, Any]:
         """Execute a function by name with the appropriate tool.
@@ -86,7 +117,8 @@ class ToolManager:
                 "function_name": function_name
             }
     
-    def get_function_schemas(self, api_format: str = "responses") -> list:
+    @staticmethod
+    def get_function_schemas(api_format: str = "responses") -> list:
         """Get the function schemas for OpenAI function calling.
         
         Args:
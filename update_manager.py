@@ -9,13 +9,20 @@ Usage: Called programmatically from luzia.py
 """
 
 import os
-import json
+import re
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from openai import OpenAI
 from pathlib import Path
 import colorama
 from colorama import Fore, Style
+from tools.text_utils import decode_json_at
+
+
+# Fields pulled out of stringified image generation results
+_FILE_PATH_RE = re.compile(r"'file_path': '([^']+)'")
+_FINAL_PROMPT_RE = re.compile(r"'final_prompt': '([^']+)'")
+_ORIGINAL_PROMPT_RE = re.compile(r"'original_prompt': '([^']+)'")
 
 
 class ScratchpadUpdateManager:
@@ -141,22 +148,23 @@ class ScratchpadUpdateManager:
         tool_responses: List[Dict] = None
     ) -> str:
         """Prepare the conversation context for analysis."""
-        context = f"""CONVERSATION CYCLE ANALYSIS
+        # Collect the pieces and join once rather than growing one string per line
+        parts = [f"""CONVERSATION CYCLE ANALYSIS
 
 USER MESSAGE:
 {user_message}
 
 AI RESPONSE:
 {ai_response}
-"""
+"""]
         
         if function_calls:
-            context += "\nFUNCTION CALLS MADE:\n"
+            parts.append("\nFUNCTION CALLS MADE:\n")
             for i, call in enumerate(function_calls):
-                context += f"{i+1}. {call.get('name', 'unknown')}({call.get('arguments', {})})\n"
+                parts.append(f"{i+1}. {call.get('name', 'unknown')}({call.get('arguments', {})})\n")
         
         if tool_responses:
-            context += "\nTOOL RESPONSES:\n"
+            parts.append("\nTOOL RESPONSES:\n")
             for i, response in enumerate(tool_responses):
                 # Handle complex responses safely
                 response_str = str(response)
@@ -165,22 +173,21 @@ AI RESPONSE:
                         # Extract key info from image generation
                         result = response.get('result', {})
                         if isinstance(result, str) and 'file_path' in result:
-                            context += f"{i+1}. Image generated and saved to media folder\n"
+                            parts.append(f"{i+1}. Image generated and saved to media folder\n")
                         elif isinstance(result, dict):
                             file_path = result.get('file_path', 'unknown')
                             prompt = result.get('final_prompt', result.get('original_prompt', 'unknown'))
-                            context += f"{i+1}. Image generated: {file_path}, prompt: {prompt[:100]}...\n"
+                            parts.append(f"{i+1}. Image generated: {file_path}, prompt: {prompt[:100]}...\n")
                         else:
-                            context += f"{i+1}. Image generation response: {str(result)[:100]}...\n"
+                            parts.append(f"{i+1}. Image generation response: {str(result)[:100]}...\n")
                     else:
-                        context += f"{i+1}. {response_str[:200]}...\n"
+                        parts.append(f"{i+1}. {response_str[:200]}...\n")
                 elif "Image generation:" in response_str and "file_path" in response_str:
                     # Parse image generation result from string format
                     try:
-                        import re
-                        file_path_match = re.search(r"'file_path': '([^']+)'", response_str)
-                        prompt_match = re.search(r"'final_prompt': '([^']+)'", response_str)
-                        original_prompt_match = re.search(r"'original_prompt': '([^']+)'", response_str)
+                        file_path_match = _FILE_PATH_RE.search(response_str)
+                        prompt_match = _FINAL_PROMPT_RE.search(response_str)
+                        original_prompt_match = _ORIGINAL_PROMPT_RE.search(response_str)
                         
                         if file_path_match:
                             file_path = file_path_match.group(1)
@@ -189,15 +196,15 @@ AI RESPONSE:
                             prompt = final_prompt or original_prompt or "unknown prompt"
                             
                             # Store the actual local file path for the update system
-                            context += f"{i+1}. Image generated: ACTUAL_FILE_PATH={file_path}, description: {prompt[:100]}...\n"
+                            parts.append(f"{i+1}. Image generated: ACTUAL_FILE_PATH={file_path}, description: {prompt[:100]}...\n")
                         else:
-                            context += f"{i+1}. {response_str[:200]}...\n"
+                            parts.append(f"{i+1}. {response_str[:200]}...\n")
                     except:
-                        context += f"{i+1}. {response_str[:200]}...\n"
+                        parts.append(f"{i+1}. {response_str[:200]}...\n")
                 else:
-                    context += f"{i+1}. {response_str[:200]}...\n"
+                    parts.append(f"{i+1}. {response_str[:200]}...\n")
         
-        return context
+        return "".join(parts)
     
     def _analyze_with_ai(self, conversation_context: str, current_scratchpad: str) -> Dict:
         """Use GPT-4.1-nano to analyze the conversation for updates."""
@@ -223,24 +230,14 @@ Please analyze this conversation and determine if any updates to the scratchpad
                 max_tokens=1000
             )
             
-            # Parse JSON response
+            # Parse JSON response (in case there's extra text or a markdown fence)
             content = response.choices[0].message.content.strip()
+            analysis = decode_json_at(content, '{')
+            if analysis is None:
+                self._log_update_analysis("Failed to parse AI response as JSON", Fore.RED)
+                return {"should_update": False, "error": "Invalid JSON response"}
+            return analysis
             
-            # Extract JSON from response (in case there's extra text)
-            if "```json" in content:
-                start = content.find("```json") + 7
-                end = content.find("```", start)
-                content = content[start:end].strip()
-            elif "{" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                content = content[start:end]
-            
-            return json.loads(content)
-            
-        except json.JSONDecodeError as e:
-            self._log_update_analysis(f"Failed to parse AI response as JSON: {e}", Fore.RED)
-            return {"should_update": False, "error": "Invalid JSON response"}
         except Exception as e:
             self._log_update_analysis(f"AI analysis failed: {e}", Fore.RED)
             return {"should_update": False, "error": str(e)}